@@ -0,0 +1,360 @@
+import asyncio
+import html
+import json
+import os
+import posixpath
+from email.utils import formatdate
+from http import HTTPStatus
+from urllib.parse import urlparse, parse_qs, unquote, quote
+
+import metrics
+from main import (sessions, dungeon_pool, floor_cache, apply_action, action_label, state_json, fogged_map,
+                  session_token, ACTIONS, TILE_ROUTE, MAP_ROUTE, IMMUTABLE_ROUTE, ATLAS_ROUTE, METRICS_ROUTE,
+                  PRIVATE_DIRS, SESSION_COOKIE, event_keepalive, max_body_size, static_files, is_private_path,
+                  sprite_manifest)
+
+keepalive_timeout = 30  # seconds an idle keep-alive connection stays open
+max_header_size = 64 * 1024
+
+
+class Request:
+    __slots__ = ('method', 'path', 'qs', 'headers', 'body', 'keep_alive')
+
+    def __init__(self, method, target, version, headers, body):
+        parsed = urlparse(target)
+        self.method = method
+        self.path = parsed.path
+        self.qs = parse_qs(parsed.query)
+        self.headers = headers
+        self.body = body
+        connection = headers.get("connection", "").lower()
+        if version == "HTTP/1.1":
+            self.keep_alive = connection != "close"
+        else:
+            self.keep_alive = connection == "keep-alive"
+
+
+async def read_request(reader):
+    """Reads one request off the connection, None once the client has closed it."""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise ValueError("Incomplete request")
+    except asyncio.LimitOverrunError:
+        raise ValueError("Request header too large")
+
+    lines = head.decode("latin-1").split("\r\n")
+    method, target, version = lines[0].split()  # ValueError on a bad request line
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get("content-length") or 0)
+    if not 0 <= length <= max_body_size:
+        raise ValueError("Bad Content-Length")
+    body = await reader.readexactly(length) if length else b""
+    return Request(method, target, version, headers, body)
+
+
+class AsyncGameServer:
+    """
+    Single-threaded alternative to main.run_server built on asyncio streams.
+
+    Serves the same routes as RPGRequestHandler over HTTP/1.1 keep-alive
+    connections. Game logic runs on the event loop, shared with main's
+    sessions; creating or restoring a session, taking a restart dungeon from
+    the pool, rendering tiles and reading files go to the default executor.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or os.getcwd()
+        self._watchers = {}  # session -> asyncio.Events of its open event streams
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(read_request(reader), keepalive_timeout)
+                except (asyncio.TimeoutError, ConnectionError):
+                    break
+                except ValueError as e:
+                    await self.send_error(writer, HTTPStatus.BAD_REQUEST, str(e), keep_alive=False)
+                    break
+                if request is None:
+                    break
+                if not await self.dispatch(request, writer):
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, request, writer):
+        """Answers one request, returns False if the connection must be closed."""
+        keep_alive = request.keep_alive
+        if request.method == "POST" and request.path == '/api/action':
+            await self.post_action(request, writer)
+        elif request.method != "GET":
+            await self.send_error(writer, HTTPStatus.NOT_IMPLEMENTED, f"Unsupported method ({request.method})", keep_alive)
+        elif request.path == '/api/game_state':
+            await self.game_state(request, writer)
+        elif request.path == '/api/events':
+            session, cookie = await self.get_session(request.qs, request.headers)
+            await self.stream_events(writer, session, cookie)
+            return False
+        elif request.path == METRICS_ROUTE:
+            await self.send(writer, HTTPStatus.OK, metrics.render().encode("utf-8"), metrics.CONTENT_TYPE,
+                            [("Cache-Control", "no-cache")], keep_alive)
+        elif request.path == '/':
+            await self.send_file(writer, request, os.path.join(self.root, "index.html"))
+        elif request.path == ATLAS_ROUTE:
+            await self.send_atlas(writer, request)
+        elif request.path == MAP_ROUTE:
+            await self.send_fogged_map(writer, request)
+        elif TILE_ROUTE.match(request.path):
+            map_id, z, tx, ty = TILE_ROUTE.match(request.path).groups()
+            await self.send_fogged_map(writer, request, map_id, int(z), int(tx), int(ty))
+        else:
+            await self.send_static(writer, request)
+        return keep_alive
+
+    # --- Responses ---
+
+    async def send(self, writer, status, body=b"", content_type=None, headers=(), keep_alive=True):
+        lines = [f"HTTP/1.1 {status.value} {status.phrase}", f"Date: {formatdate(usegmt=True)}"]
+        if content_type:
+            lines.append(f"Content-type: {content_type}")
+        lines.extend(f"{name}: {value}" for name, value in headers)
+        if status not in (HTTPStatus.NO_CONTENT, HTTPStatus.NOT_MODIFIED):
+            lines.append(f"Content-Length: {len(body)}")
+        lines.append("Connection: " + ("keep-alive" if keep_alive else "close"))
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    async def send_error(self, writer, status, message, keep_alive=True):
+        await self.send(writer, status, f"{status.value} {message}\n".encode("utf-8"),
+                        "text/plain; charset=utf-8", keep_alive=keep_alive)
+
+    async def send_json(self, writer, status, body, headers=(), keep_alive=True):
+        await self.send(writer, status, body.encode("utf-8"), "application/json; charset=utf-8",
+                        [("Cache-Control", "no-cache"), *headers], keep_alive)
+
+    # --- Game API ---
+
+    async def get_session(self, qs, headers):
+        """(session, Set-Cookie headers), same lookup as RPGRequestHandler.get_session."""
+        token = session_token(qs, headers.get("cookie"))
+        session = sessions.get(token)
+        if session is not None:
+            return session, ()
+        # New games take a dungeon from the pool and restores read the journal
+        session, created = await asyncio.get_running_loop().run_in_executor(None, sessions.get_or_create, token)
+        if not created:
+            return session, ()
+        return session, [("Set-Cookie", f"{SESSION_COOKIE}={session.token}; Path=/; HttpOnly; SameSite=Lax")]
+
+    async def apply(self, session, action, qs):
+        # Both can build a dungeon inline: the pool's for a restart, the floor
+        # below for a move onto the stairs (if it was evicted or is still queued)
+        loop = asyncio.get_running_loop()
+        dungeon = None
+        if action == "restart":
+            dungeon = await loop.run_in_executor(None, dungeon_pool.get)
+        elif session.game.takes_stairs(action):
+            floor = session.game.next_floor()
+            dungeon = await loop.run_in_executor(None, floor_cache.get, *floor)
+            if session.game.next_floor() != floor:
+                dungeon = None  # another request changed floors meanwhile
+        with session.lock:
+            if apply_action(session.game, action, qs, session.journal, dungeon):
+                session.notify()
+                self.wake(session)
+
+    def wake(self, session):
+        """Wakes the session's event streams, to send a new state or to end once it is closed."""
+        for waiter in self._watchers.get(session, ()):
+            waiter.set()
+
+    async def game_state(self, request, writer):
+        try:
+            session, cookie = await self.get_session(request.qs, request.headers)
+            await self.apply(session, request.qs.get("action", [None])[0], request.qs)
+            with session.lock:
+                body = state_json(session.game, request.qs)
+        except Exception as e:
+            metrics.ERRORS.inc((request.path,))
+            error_json = json.dumps({"error": f"Server error: {e.__class__.__name__}", "details": str(e)})
+            await self.send_json(writer, HTTPStatus.INTERNAL_SERVER_ERROR, error_json, keep_alive=request.keep_alive)
+            print(f"Error processing API request: {e}")
+            return
+        with metrics.PHASES.time("write", action_label(request.qs)):
+            await self.send_json(writer, HTTPStatus.OK, body, cookie, request.keep_alive)
+
+    async def post_action(self, request, writer):
+        qs = {**request.qs, **parse_qs(request.body.decode("utf-8", "replace"))}
+        action = qs.get("action", [None])[0]
+        if action not in ACTIONS:
+            await self.send_error(writer, HTTPStatus.BAD_REQUEST, f"Unknown action: {action}", request.keep_alive)
+            return
+        try:
+            session, cookie = await self.get_session(qs, request.headers)
+            await self.apply(session, action, qs)
+        except Exception as e:
+            metrics.ERRORS.inc((request.path,))
+            error_json = json.dumps({"error": f"Server error: {e.__class__.__name__}", "details": str(e)})
+            await self.send_json(writer, HTTPStatus.INTERNAL_SERVER_ERROR, error_json, keep_alive=request.keep_alive)
+            print(f"Error processing API request: {e}")
+            return
+        await self.send(writer, HTTPStatus.NO_CONTENT, headers=cookie, keep_alive=request.keep_alive)
+
+    async def stream_events(self, writer, session, cookie):
+        """Server-Sent Events, same stream as RPGRequestHandler.stream_events."""
+        head = ["HTTP/1.1 200 OK", "Content-type: text/event-stream; charset=utf-8",
+                "Cache-Control: no-cache", "Connection: close", *(f"{k}: {v}" for k, v in cookie)]
+        writer.write(("\r\n".join(head) + "\r\n\r\nretry: 2000\n\n").encode("utf-8"))
+
+        baseline, seen = None, None
+        while not session.closed:
+            if session.revision != seen:
+                with session.lock, metrics.PHASES.time("state", "event"):
+                    seen = session.revision
+                    state, baseline = session.game.state_delta(baseline)
+                with metrics.PHASES.time("encode", "event"):
+                    message = f"data: {json.dumps(state)}\n\n".encode("utf-8")
+            else:
+                message = b": keep-alive\n\n"  # also finds dead connections
+            with metrics.PHASES.time("write", "event"):
+                writer.write(message)
+                await writer.drain()
+            if session.revision != seen:
+                continue
+
+            waiter = asyncio.Event()
+            waiters = self._watchers.setdefault(session, set())
+            waiters.add(waiter)
+            try:
+                await asyncio.wait_for(waiter.wait(), event_keepalive)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                waiters.discard(waiter)
+                if not waiters:
+                    self._watchers.pop(session, None)
+
+    # --- Files ---
+
+    async def send_atlas(self, writer, request):
+        try:
+            manifest_path = await asyncio.get_running_loop().run_in_executor(None, sprite_manifest)
+        except Exception as e:
+            await self.send_error(writer, HTTPStatus.INTERNAL_SERVER_ERROR, f"Error building the sprite atlas: {e}",
+                                  request.keep_alive)
+            return
+        await self.send_file(writer, request, manifest_path)
+
+    async def send_fogged_map(self, writer, request, *tile):
+        """Same as RPGRequestHandler.send_fogged_map, rendered in the default executor."""
+        keep_alive = request.keep_alive
+        session = sessions.get(session_token(request.qs, request.headers.get("cookie")))
+        if session is None:
+            await self.send_error(writer, HTTPStatus.NOT_FOUND, "No session", keep_alive)
+            return
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(None, fogged_map, session, *tile)
+        except ValueError as e:
+            await self.send_error(writer, HTTPStatus.NOT_FOUND, str(e), keep_alive)
+            return
+        except Exception as e:
+            await self.send_error(writer, HTTPStatus.INTERNAL_SERVER_ERROR, f"Error rendering the map: {e}", keep_alive)
+            return
+        await self.send_result(writer, request, result)
+
+    def translate_path(self, path):
+        # Like SimpleHTTPRequestHandler.translate_path: no way out of root
+        path = posixpath.normpath(unquote(path))
+        parts = [p for p in path.split("/") if p and p not in (os.curdir, os.pardir)]
+        return os.path.join(self.root, *parts)
+
+    async def send_static(self, writer, request):
+        url_path, keep_alive = request.path, request.keep_alive
+        if is_private_path(url_path):
+            await self.send_error(writer, HTTPStatus.NOT_FOUND, "File not found", keep_alive)
+            return
+        path = self.translate_path(url_path)
+        if os.path.isdir(path):
+            if not url_path.endswith("/"):
+                await self.send(writer, HTTPStatus.MOVED_PERMANENTLY, headers=[("Location", url_path + "/")],
+                                keep_alive=keep_alive)
+                return
+            await self.send_listing(writer, path, url_path, keep_alive)
+            return
+        await self.send_file(writer, request, path, bool(IMMUTABLE_ROUTE.match(url_path)))
+
+    async def send_file(self, writer, request, path, immutable=False):
+        """Serves a file through main.static_files (ETag/304, gzip, Cache-Control)."""
+        result = await asyncio.get_running_loop().run_in_executor(
+            None, static_files.respond, path, request.headers.get("if-none-match"),
+            request.headers.get("accept-encoding", ""), immutable)
+        if result is None:
+            await self.send_error(writer, HTTPStatus.NOT_FOUND, "File not found", request.keep_alive)
+            return
+        await self.send_result(writer, request, result)
+
+    async def send_result(self, writer, request, result):
+        code, headers, body = result
+        # send() adds its own Content-Length
+        headers = [(name, value) for name, value in headers if name != "Content-Length"]
+        await self.send(writer, HTTPStatus(code), body, headers=headers, keep_alive=request.keep_alive)
+
+    async def send_listing(self, writer, path, url_path, keep_alive=True):
+        # index.html reads ./characters/ as a listing of <a href> links
+        try:
+            names = sorted(os.listdir(path), key=str.lower)
+        except OSError:
+            await self.send_error(writer, HTTPStatus.NOT_FOUND, "No permission to list directory", keep_alive)
+            return
+        title = html.escape(unquote(url_path))
+        items = []
+        if os.path.normpath(path) == os.path.normpath(self.root):
+            names = [name for name in names if name not in PRIVATE_DIRS]
+        for name in names:
+            link = name + "/" if os.path.isdir(os.path.join(path, name)) else name
+            items.append(f'<li><a href="{quote(link)}">{html.escape(link)}</a></li>')
+        body = (f"<!DOCTYPE HTML>\n<html>\n<head><title>Directory listing for {title}</title></head>\n"
+                f"<body>\n<h1>Directory listing for {title}</h1>\n<ul>\n" + "\n".join(items) + "\n</ul>\n</body>\n</html>\n")
+        await self.send(writer, HTTPStatus.OK, body.encode("utf-8"), "text/html; charset=utf-8", keep_alive=keep_alive)
+
+
+async def serve(port=8000, host=""):
+    server = AsyncGameServer()
+    # Evictions happen in executor threads, the streams' events belong to the loop
+    loop = asyncio.get_running_loop()
+    sessions.add_close_listener(lambda session: loop.call_soon_threadsafe(server.wake, session))
+    dungeon_pool.start()
+    static_files.preload(os.path.join(server.root, "index.html"))
+    try:
+        static_files.preload(sprite_manifest())
+    except Exception as e:
+        print(f"Could not build the sprite atlas: {e}")
+    listener = await asyncio.start_server(server.handle, host or None, port,
+                                          limit=max_header_size, backlog=1024)
+    async with listener:
+        await listener.serve_forever()
+
+
+def run_server(port=8000):
+    print(f"RPG server (asyncio) running at http://localhost:{port}\n")
+    try:
+        asyncio.run(serve(port))
+    except KeyboardInterrupt:
+        print("\nShutting down the server.")
+    finally:
+        dungeon_pool.close()
+        floor_cache.close()
+
+if __name__ == "__main__":
+    run_server(8000)
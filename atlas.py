@@ -0,0 +1,132 @@
+import hashlib
+import json
+import math
+import os
+import threading
+
+import cv2
+import numpy as np
+
+import dungeon_gen as dgen
+
+SPRITE_SIZE = 128  # px per atlas cell; the client shows sprites at 24-64 px
+SPRITE_DIRS = ("characters", "enemies")
+ATLAS_DIR = os.path.join(dgen.MAP_DIR, "atlas")
+MANIFEST = os.path.join(ATLAS_DIR, "manifest.json")
+
+_atlas_lock = threading.Lock()
+
+
+def sprite_key(name):
+    # Same naming as the sprite files: "Giant Rat" -> giant_rat.png
+    return name.lower().replace(" ", "_") + ".png"
+
+
+def source_stamps(root=dgen.SCRIPT_DIR):
+    """{'characters/x.png': [mtime_ns, size], ...} for every sprite file."""
+    stamps = {}
+    for directory in SPRITE_DIRS:
+        try:
+            names = sorted(os.listdir(os.path.join(root, directory)))
+        except OSError:
+            continue
+        for name in names:
+            if name.lower().endswith(".png"):
+                st = os.stat(os.path.join(root, directory, name))
+                stamps[f"{directory}/{name}"] = [st.st_mtime_ns, st.st_size]
+    return stamps
+
+
+def load_sprite(path, size=SPRITE_SIZE):
+    """The sprite as BGRA, scaled to fit size x size and centered."""
+    image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if image is None:
+        raise OSError(f"Could not read sprite '{path}'")
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGRA)
+    elif image.shape[2] == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)
+    h, w = image.shape[:2]
+    scale = size / max(h, w)
+    nh, nw = max(1, round(h * scale)), max(1, round(w * scale))
+    image = cv2.resize(image, (nw, nh), interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_NEAREST)
+    cell = np.zeros((size, size, 4), dtype=np.uint8)
+    y, x = (size - nh) // 2, (size - nw) // 2
+    cell[y:y + nh, x:x + nw] = image
+    return cell
+
+
+def build_atlas(enemy_names, root=dgen.SCRIPT_DIR, size=SPRITE_SIZE, stamps=None):
+    """
+    Packs every sprite into one grid PNG named after its md5 and writes the
+    manifest: the image URL, its size, the source stamps and [x, y, w, h]
+    rects for characters (by file name) and for enemies (by ENEMY_TYPES name,
+    only those that have a sprite file).
+    """
+    stamps = source_stamps(root) if stamps is None else stamps
+    files = list(stamps)
+    cols = max(1, math.ceil(math.sqrt(len(files))))
+    rows = max(1, math.ceil(len(files) / cols))
+    image = np.zeros((rows * size, cols * size, 4), dtype=np.uint8)
+
+    rects = {}
+    for i, rel in enumerate(files):
+        y, x = (i // cols) * size, (i % cols) * size
+        image[y:y + size, x:x + size] = load_sprite(os.path.join(root, rel), size)
+        rects[rel] = [x, y, size, size]
+
+    ok, encoded = cv2.imencode(".png", image)
+    if not ok:
+        raise OSError("Could not encode the sprite atlas")
+    md5_hash = hashlib.md5(encoded.tobytes()).hexdigest()
+    image_path = os.path.join(ATLAS_DIR, f"{md5_hash}.png")
+    os.makedirs(ATLAS_DIR, exist_ok=True)
+    if not os.path.exists(image_path):
+        dgen.write_png(image_path, image)
+
+    manifest = {
+        "image": f"./maps/atlas/{md5_hash}.png",
+        "width": cols * size,
+        "height": rows * size,
+        "sprite_size": size,
+        "sources": stamps,
+        "enemy_names": sorted(set(enemy_names)),
+        "characters": {rel.split("/", 1)[1]: rect for rel, rect in rects.items() if rel.startswith("characters/")},
+        "enemies": {name: rects[f"enemies/{sprite_key(name)}"] for name in sorted(set(enemy_names))
+                    if f"enemies/{sprite_key(name)}" in rects},
+    }
+    tmp_manifest = f"{MANIFEST}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_manifest, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_manifest, MANIFEST)
+    return manifest
+
+
+def ensure_atlas(enemy_names, root=dgen.SCRIPT_DIR, size=SPRITE_SIZE):
+    """
+    Returns the manifest path, rebuilding the atlas only when a sprite file
+    was added, removed or changed (mtime/size), or the names or size differ.
+    """
+    with _atlas_lock:
+        stamps = source_stamps(root)
+        try:
+            with open(MANIFEST, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            fresh = (manifest["sources"] == stamps and manifest["sprite_size"] == size
+                     and manifest["enemy_names"] == sorted(set(enemy_names))
+                     and os.path.exists(os.path.join(dgen.SCRIPT_DIR, manifest["image"])))
+        except (OSError, ValueError, KeyError):
+            fresh = False
+        if not fresh:
+            build_atlas(enemy_names, root, size, stamps)
+        return MANIFEST
+
+
+if __name__ == "__main__":
+    # Build step: python atlas.py
+    from main import ENEMY_TYPES
+    path = ensure_atlas([name for names in ENEMY_TYPES.values() for name in names])
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    print(f"Atlas {manifest['image']}: {len(manifest['characters'])} characters, "
+          f"{len(manifest['enemies'])} enemies ({manifest['width']}x{manifest['height']})")
@@ -0,0 +1,113 @@
+"""
+Memory and move throughput of 10k Beings: the original dict-based Being
+(list/ndarray positions) against the slotted main.Being (int y/x).
+
+    python benchmarks/bench_beings.py [--count 10000] [--steps 20]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main
+from main import directions, sides, ensure_list
+
+
+class LegacyBeing:
+    # Reference implementation: the original Being fields and NPC move.
+    def __init__(self, n, name, class_number, position, hp, defense, attack, special, facing):
+        self.n = n
+        self.name = name
+        self.cn = class_number
+        self.hp = hp
+        self.defense = defense
+        self.attack_power = attack
+        self.special_power = special
+        self.is_player = False
+        self.max_hp = hp
+        self.position = position
+        self.facing = facing
+
+    def move_being(self, player, occupancy, walkable_mask, rng):
+        random_index = rng.randint(0, 3)
+        movement_vector = sides[random_index]
+        new_position = self.position + movement_vector
+        new_position = ensure_list(new_position)
+        free = (occupancy[new_position[0], new_position[1]] < 0
+                and new_position != player.position
+                and walkable_mask[new_position[0], new_position[1]])
+        if free and self.position != new_position:
+            occupancy[self.position[0], self.position[1]] = -1
+            occupancy[new_position[0], new_position[1]] = self.n
+            self.position = new_position
+            self.facing = directions[random_index]
+        return False
+
+
+def arena(count):
+    # Open floor with a wall border, about half of it occupied
+    side = int(np.ceil(np.sqrt(count * 2))) + 2
+    walkable_mask = np.ones((side, side), dtype=bool)
+    walkable_mask[[0, -1], :] = walkable_mask[:, [0, -1]] = False
+    cells = np.argwhere(walkable_mask)
+    picks = np.random.RandomState(0).choice(len(cells), size=count + 1, replace=False)
+    return walkable_mask, cells[picks].tolist()
+
+
+def build(kind, positions, stats):
+    hp, defense, attack, special = (stats[k].tolist() for k in ("hp", "defense", "attack_power", "special_power"))
+    if kind == "legacy":
+        return [LegacyBeing(i, "Giant Rat", 1, list(positions[i]), hp[i], defense[i], attack[i], special[i], "n")
+                for i in range(len(hp))]
+    return [main.Being.from_stats("Giant Rat", 1, positions[i], hp[i], defense[i], attack[i], special[i], "n", n=i)
+            for i in range(len(hp))]
+
+
+def measure(kind, count, steps):
+    walkable_mask, positions = arena(count)
+    stats = main.roll_stats(1, count, np.random.RandomState(0))
+    player = main.Being("Hero", 1, positions[-1], is_player=True, rng=random.Random(0))
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    beings = build(kind, positions, stats)
+    memory = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    occupancy = np.full(walkable_mask.shape, -1, dtype=np.int32)
+    for b in beings:
+        occupancy[b.position[0], b.position[1]] = b.n
+    rng = random.Random(0)
+    t = time.perf_counter()
+    for _ in range(steps):
+        for b in beings:
+            if kind == "legacy":
+                b.move_being(player, occupancy, walkable_mask, rng)
+            else:
+                b.move_being(player=player, occupancy=occupancy, walkable_mask=walkable_mask, rng=rng)
+    elapsed = time.perf_counter() - t
+    final = [tuple(b.position) for b in beings]
+    return memory, count * steps / elapsed, final
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=10000)
+    parser.add_argument("--steps", type=int, default=20)
+    args = parser.parse_args()
+
+    results = {kind: measure(kind, args.count, args.steps) for kind in ("legacy", "slotted")}
+    print(f"{'being':>8} {'bytes/being':>12} {'moves/s':>12}")
+    for kind, (memory, rate, _) in results.items():
+        print(f"{kind:>8} {memory / args.count:>12.0f} {rate:>12,.0f}")
+    same = results["legacy"][2] == results["slotted"][2]
+    print(f"same final positions: {same}")
+
+
+if __name__ == "__main__":
+    main_cli()
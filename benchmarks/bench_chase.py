@@ -0,0 +1,154 @@
+"""
+Cost of one turn of chasing NPCs on a generated dungeon: a per-enemy A*
+search towards the player against one shared pathfinding.FlowField followed
+by every enemy, as Being.move_being calls and as one EnemyStore.step.
+
+    python benchmarks/bench_chase.py [--counts 100 300 1000] [--radius 8] [--turns 100] [--seed 0]
+"""
+import argparse
+import heapq
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main
+from dungeon_pool import prepare_dungeon
+from enemy_store import EnemyStore
+from pathfinding import PathFinder, distance_field
+
+
+def astar_step(walkable_mask, start, goal, max_distance):
+    # Reference implementation: what each enemy would pay without a shared field
+    if abs(start[0] - goal[0]) + abs(start[1] - goal[1]) > max_distance:
+        return -1
+    open_set = [(0, 0, start)]
+    came_from = {start: None}
+    cost = {start: 0}
+    while open_set:
+        _, g, cell = heapq.heappop(open_set)
+        if cell == goal:
+            if cell == start:
+                return -1
+            while came_from[cell] != start:
+                cell = came_from[cell]
+            return main.side_steps.index((cell[0] - start[0], cell[1] - start[1]))
+        if g >= max_distance or g > cost[cell]:
+            continue
+        for dy, dx in main.side_steps:
+            nxt = (cell[0] + dy, cell[1] + dx)
+            if walkable_mask[nxt] and g + 1 < cost.get(nxt, max_distance + 1):
+                cost[nxt] = g + 1
+                came_from[nxt] = cell
+                heapq.heappush(open_set, (g + 1 + abs(nxt[0] - goal[0]) + abs(nxt[1] - goal[1]), g + 1, nxt))
+    return -1
+
+
+def setup(count, seed, turns):
+    dungeon = prepare_dungeon(None, render=False, rng=np.random.RandomState(seed))
+    walkable_mask = np.isin(dungeon.map, main.walkable)
+    cells = np.argwhere(walkable_mask)
+    start = tuple(cells[np.random.RandomState(seed).randint(len(cells))].tolist())
+    # Enemies on the cells closest to the player, so as many as possible are hunting
+    distance, _, (y0, x0) = distance_field(walkable_mask, start, max(walkable_mask.shape))
+    order = np.argsort(np.where(distance >= 0, distance, np.iinfo(np.int16).max), axis=None, kind="stable")
+    picks = np.column_stack(np.unravel_index(order[1:count + 1], distance.shape)) + (y0, x0)
+    stats = main.roll_stats(1, len(picks), np.random.RandomState(seed))
+    enemies = [main.Being.from_stats("Giant Rat", 1, p.tolist(), int(stats["hp"][i]), int(stats["defense"][i]),
+                                     int(stats["attack_power"][i]), int(stats["special_power"][i]), "n", n=i)
+               for i, p in enumerate(picks)]
+    # The player's walk: one random step per turn, like a player exploring
+    rng = random.Random(seed)
+    trail = [start]
+    while len(trail) < turns:
+        y, x = trail[-1]
+        steps = [(y + dy, x + dx) for dy, dx in main.side_steps if walkable_mask[y + dy, x + dx]]
+        trail.append(rng.choice(steps) if steps else (y, x))
+    return walkable_mask, enemies, trail
+
+
+def occupancy_of(walkable_mask, enemies):
+    occupancy = np.full(walkable_mask.shape, -1, dtype=np.int32)
+    for e in enemies:
+        occupancy[e.y, e.x] = e.n
+    return occupancy
+
+
+def per_turn(fn, turns):
+    t = time.perf_counter()
+    for turn in range(turns):
+        fn(turn)
+    return (time.perf_counter() - t) / turns * 1e3
+
+
+def measure(count, radius, turns, seed):
+    walkable_mask, enemies, trail = setup(count, seed, turns)
+    player = main.Being("Hero", 1, trail[0], is_player=True, rng=random.Random(seed))
+    pathfinder = PathFinder(walkable_mask, radius)
+    rng = random.Random(seed)
+
+    def place(turn):
+        player.y, player.x = trail[turn % len(trail)]
+
+    def astar_turn(turn):
+        place(turn)
+        goal = (player.y, player.x)
+        for e in enemies:
+            astar_step(walkable_mask, (e.y, e.x), goal, radius)
+
+    def field_turn(turn):
+        place(turn)
+        pathfinder.field(player.position)
+
+    occupancy = occupancy_of(walkable_mask, enemies)
+
+    def beings_turn(turn):
+        place(turn)
+        flow = pathfinder.field(player.position)
+        for e in enemies:
+            e.move_being(player=player, occupancy=occupancy, walkable_mask=walkable_mask, rng=rng, flow=flow)
+
+    store = EnemyStore(enemies)
+    store_occupancy = occupancy_of(walkable_mask, enemies)
+    np_rng = np.random.RandomState(seed)
+
+    def store_turn(turn):
+        place(turn)
+        store.step(walkable_mask, store_occupancy, player.position, np_rng, pathfinder.field(player.position))
+
+    results = {"astar": per_turn(astar_turn, max(1, turns // 10))}
+    pathfinder.invalidate()
+    results["field"] = per_turn(field_turn, turns)
+    pathfinder.invalidate()
+    results["beings"] = per_turn(beings_turn, turns)
+    pathfinder.invalidate()
+    results["store"] = per_turn(store_turn, turns)
+    results["cached"] = per_turn(lambda turn: pathfinder.field(player.position), turns)
+    place(0)
+    flow = pathfinder.field(player.position)
+    results["hunting"] = sum(flow.direction(e.y, e.x) >= 0 for e in enemies)
+    return len(enemies), results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--counts", type=int, nargs="+", default=[100, 300, 1000])
+    parser.add_argument("--radius", type=int, default=main.enemy_chase_radius or 8)
+    parser.add_argument("--turns", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"radius {args.radius}, ms per turn (hunting = enemies inside the first field, field = fields along the walk, "
+          f"cached = field lookup on a cache hit)")
+    print(f"{'enemies':>7} {'hunting':>7} {'A*':>9} {'field':>7} {'cached':>7} {'beings':>7} {'store':>7}")
+    for count in args.counts:
+        n, r = measure(count, args.radius, args.turns, args.seed)
+        print(f"{n:>7} {r['hunting']:>7} {r['astar']:>9.2f} {r['field']:>7.3f} {r['cached']:>7.4f} "
+              f"{r['beings']:>7.3f} {r['store']:>7.3f}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,85 @@
+"""
+Compares the original per-cell door placement loop with the vectorized
+dungeon_gen.place_doors on maps of increasing size.
+
+    python benchmarks/bench_doors.py [--sizes 100 500 1000] [--repeat 3]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import dungeon_gen as dgen
+from dungeon_gen import CORRIDOR, ROOM, WALL, DOOR, SECRET, LOCKED, TRAPPED
+
+
+def place_doors_loop(grid):
+    # Reference implementation: the original "Place Doors" step.
+    height, width = grid.shape
+    for y in range(1, height - 1):
+        for x in range(1, width - 1):
+            if grid[y, x] == CORRIDOR:
+                up, down = grid[y - 1, x], grid[y + 1, x]
+                left, right = grid[y, x - 1], grid[y, x + 1]
+
+                vertical = ((up == ROOM and down == CORRIDOR) or (down == ROOM and up == CORRIDOR)) \
+                           and left == WALL and right == WALL
+                horizontal = ((left == ROOM and right == CORRIDOR) or (right == ROOM and left == CORRIDOR)) \
+                             and up == WALL and down == WALL
+
+                if vertical or horizontal:
+                    grid[y, x] = DOOR if random.random() > 0.16 else random.choice([SECRET, LOCKED, TRAPPED])
+    return grid
+
+
+def carved_grid(seed, size):
+    # Rooms and corridors only, i.e. the grid right before the door pass.
+    random.seed(seed)
+    grid = np.full((size, size), WALL, dtype=np.int32)
+    root = dgen.Node(0, 0, size, size)
+    nodes = [root]
+    while nodes:
+        node = nodes.pop(0)
+        if node.split():
+            nodes.extend([node.left, node.right])
+    root.create_room(grid)
+    return grid
+
+
+def timed(fn, grid, seed, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        g = grid.copy()
+        random.seed(seed)
+        np.random.seed(seed)
+        start = time.perf_counter()
+        fn(g)
+        best = min(best, time.perf_counter() - start)
+    return best, g
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[40, 100, 500, 1000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    print(f"{'size':>6} {'loop (ms)':>11} {'exact (ms)':>11} {'fast (ms)':>10} {'speedup':>8}  same doors")
+    for size in args.sizes:
+        grid = carved_grid(args.seed, size)
+        t_loop, g_loop = timed(place_doors_loop, grid, args.seed, args.repeat)
+        t_exact, g_exact = timed(dgen.place_doors, grid, args.seed, args.repeat)
+        t_fast, g_fast = timed(lambda g: dgen.place_doors(g, fast=True), grid, args.seed, args.repeat)
+
+        same = np.array_equal(g_loop, g_exact) and np.array_equal(g_loop != grid, g_fast != grid)
+        print(f"{size:>6} {t_loop * 1e3:>11.2f} {t_exact * 1e3:>11.2f} {t_fast * 1e3:>10.2f} "
+              f"{t_loop / t_exact:>7.1f}x  {same}")
+
+
+if __name__ == "__main__":
+    main()
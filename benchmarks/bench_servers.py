@@ -0,0 +1,154 @@
+"""
+Compares the threaded server (main.run_server) with the asyncio one
+(async_server.run_server) under N concurrent keep-alive clients.
+
+Every client opens one connection, gets a session and starts a game (not
+timed), then sends --actions movement/attack requests to /api/game_state as
+fast as the server answers. Reports throughput, latency percentiles and the
+server's peak memory and thread count. Journaling is turned off in the
+server processes, it costs the same in both.
+
+    python benchmarks/bench_servers.py [--clients 10 100 1000] [--actions 20]
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVERS = {
+    "threaded": "import main; main.run_server({port})",
+    "asyncio": "import async_server; async_server.run_server({port})",
+}
+BOOTSTRAP = "import main; main.sessions.journal_dir = None; main.sessions.max_sessions = {sessions}; "
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(kind, port, sessions):
+    code = BOOTSTRAP.format(sessions=sessions) + SERVERS[kind].format(port=port)
+    proc = subprocess.Popen([sys.executable, "-c", code], cwd=ROOT,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"{kind} server did not start")
+
+
+def proc_status(pid):
+    # Peak resident memory (kB) and thread count, Linux only
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                fields[name] = value.split()[0] if value.split() else ""
+    except OSError:
+        return None, None
+    return int(fields.get("VmHWM", 0)), int(fields.get("Threads", 0))
+
+
+class Client:
+    """One keep-alive HTTP/1.1 connection holding its session cookie."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.cookie = None
+
+    async def get(self, path):
+        headers = f"GET {path} HTTP/1.1\r\nHost: localhost\r\n"
+        if self.cookie:
+            headers += f"Cookie: {self.cookie}\r\n"
+        self.writer.write((headers + "\r\n").encode("latin-1"))
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        length = 0
+        for line in head.decode("latin-1").split("\r\n")[1:]:
+            name, _, value = line.partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+            elif name.lower() == "set-cookie":
+                self.cookie = value.strip().split(";")[0]
+        return await self.reader.readexactly(length)
+
+
+async def run_clients(port, pid, clients, actions, seed):
+    rng = random.Random(seed)
+    connected = []
+    for _ in range(clients):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port, limit=1 << 20)
+        connected.append(Client(reader, writer))
+    # Warm-up: sessions and games are created before the clock starts
+    for client in connected:
+        await client.get("/api/game_state")
+        await client.get("/api/game_state?action=start&name=Bench&class=1")
+
+    latencies = []
+
+    async def play(client, moves):
+        for action in moves:
+            t = time.perf_counter()
+            await client.get(f"/api/game_state?action={action}")
+            latencies.append(time.perf_counter() - t)
+
+    plans = [[rng.choice("nesw") if rng.random() < 0.8 else "a" for _ in range(actions)] for _ in connected]
+    t = time.perf_counter()
+    await asyncio.gather(*(play(c, moves) for c, moves in zip(connected, plans)))
+    elapsed = time.perf_counter() - t
+    status = proc_status(pid)  # while every connection is still open
+
+    for client in connected:
+        client.writer.close()
+    return elapsed, sorted(latencies), status
+
+
+def bench(kind, clients, actions, seed):
+    port = free_port()
+    proc = start_server(kind, port, sessions=clients * 2)
+    try:
+        elapsed, latencies, (peak_kb, threads) = asyncio.run(run_clients(port, proc.pid, clients, actions, seed))
+    finally:
+        proc.terminate()
+        proc.wait()
+    p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1e3
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50": p(0.50),
+        "p99": p(0.99),
+        "peak_mb": peak_kb / 1024 if peak_kb else float("nan"),
+        "threads": threads,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--actions", type=int, default=20, help="timed requests per client")
+    parser.add_argument("--servers", nargs="+", choices=sorted(SERVERS), default=["threaded", "asyncio"])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'server':>9} {'clients':>8} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'peak MB':>8} {'threads':>8}")
+    for clients in args.clients:
+        for kind in args.servers:
+            r = bench(kind, clients, args.actions, args.seed)
+            print(f"{kind:>9} {clients:>8} {r['rps']:>9.0f} {r['p50']:>8.2f} {r['p99']:>8.2f} "
+                  f"{r['peak_mb']:>8.1f} {r['threads']:>8}")
+
+
+if __name__ == "__main__":
+    main()
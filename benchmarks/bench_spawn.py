@@ -0,0 +1,81 @@
+"""
+Compares spawning enemies one Being at a time (the original create_enemies
+loop) with the batched main.create_enemies, and checks that both draw stats
+from the same distributions.
+
+    python benchmarks/bench_spawn.py [--counts 100 1000 10000] [--classes 1 3 5] [--repeat 3]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main
+from main import Being, ENEMY_TYPES, ensure_list
+
+STATS = ("hp", "defense", "attack_power", "special_power")
+
+
+def create_enemies_loop(class_number, n_enemies, possible_positions, rng, np_rng):
+    # Reference implementation: the original per-Being spawn.
+    random_indices = np_rng.choice(len(possible_positions), size=n_enemies, replace=False)
+    choices = ensure_list(possible_positions[random_indices])
+    enemies = []
+    for i in range(n_enemies):
+        possible_names = ENEMY_TYPES.get(class_number, [f"Anomaly Class {class_number}"])
+        name = rng.choice(possible_names)
+        enemies.append(Being(name, class_number, choices[i], n=i, rng=rng))
+    return enemies
+
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+    return min(times)
+
+
+def compare_distributions(class_number, samples=50000):
+    # Quantiles of every stat, loop vs batch; they should agree to sampling noise
+    positions = np.argwhere(np.ones((300, 300), dtype=bool))
+    loop = create_enemies_loop(class_number, samples, positions, random.Random(1), np.random.RandomState(1))
+    batch = main.create_enemies(None, class_number, samples, positions, random.Random(2), np.random.RandomState(2))
+    worst = 0.0
+    for stat in STATS:
+        a = np.array([getattr(e, stat) for e in loop], dtype=float)
+        b = np.array([getattr(e, stat) for e in batch], dtype=float)
+        qa, qb = np.percentile(a, [5, 25, 50, 75, 95]), np.percentile(b, [5, 25, 50, 75, 95])
+        worst = max(worst, float(np.max(np.abs(qa - qb) / np.maximum(qa, 1))))
+    return worst
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--counts", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--classes", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    positions = np.argwhere(np.ones((300, 300), dtype=bool))
+    print(f"{'class':>5} {'count':>7} {'loop ms':>9} {'batch ms':>9} {'speedup':>8}")
+    for class_number in args.classes:
+        for count in args.counts:
+            loop = best_of(lambda: create_enemies_loop(class_number, count, positions, random.Random(0),
+                                                       np.random.RandomState(0)), args.repeat)
+            batch = best_of(lambda: main.create_enemies(None, class_number, count, positions, random.Random(0),
+                                                        np.random.RandomState(0)), args.repeat)
+            print(f"{class_number:>5} {count:>7} {loop * 1e3:>9.2f} {batch * 1e3:>9.2f} {loop / batch:>7.1f}x")
+
+    for class_number in args.classes:
+        print(f"class {class_number}: largest relative quantile difference loop vs batch "
+              f"{compare_distributions(class_number) * 100:.2f}%")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,266 @@
+"""
+Benchmark suite for the generation, rendering and request hot paths, with
+fixed seeds so runs are comparable. Results are saved as JSON, and --compare
+flags every case slower than a stored baseline (exit status 1).
+
+    python benchmarks/run.py [--out results.json] [--compare baseline.json] [--threshold 0.25]
+                             [--filter REGEX] [--repeat 7] [--budget 10] [--quick]
+
+Record a baseline with --out baseline.json, change the code, then run with
+--compare baseline.json. Rendering cases write to maps/ like the server does.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import dungeon_gen as dgen
+import main
+from dungeon_pool import prepare_dungeon
+
+SEED = 1234
+GENERATE_SIZES = (40, 100, 500, 2000)
+RENDER_SIZES = (100, 500)
+SPAWN_COUNTS = (25, 1000, 10000)
+ACTIONS_PER_RUN = 100
+QUICK_SKIP = ("generate/2000",)  # cases too slow for --quick
+
+CASES = []  # (name, setup); setup() returns (before, fn, ops): before() is untimed, fn() runs ops operations
+
+
+def case(name):
+    def register(setup):
+        CASES.append((name, setup))
+        return setup
+    return register
+
+
+# --- Cases ---
+
+def generate_case(size):
+    def setup():
+        return None, lambda: dgen.generate_dungeon_json(SEED, size, size), 1
+    return setup
+
+
+def stored_map(size):
+    dungeon = dgen.generate_dungeon(SEED, size, size)
+    path = dgen.map_store_path(dungeon["id"])
+    if not os.path.exists(path):
+        dgen.save_dungeon_bin(dungeon)
+    return path
+
+
+def load_stored(path):
+    with contextlib.redirect_stdout(io.StringIO()):  # "Dungeon image saved as ..."
+        return dgen.load_dungeon(path, 0, 0, 0, cell_size=None, return_values=True)
+
+
+def render_miss_case(size):
+    def setup():
+        path = stored_map(size)
+        png = os.path.join(dgen.SCRIPT_DIR, load_stored(path)[1])
+
+        def before():
+            # No PNG on disk: load_dungeon renders and writes it again
+            if os.path.exists(png):
+                os.remove(png)
+        return before, lambda: load_stored(path), 1
+    return setup
+
+
+def render_hit_case(size):
+    def setup():
+        path = stored_map(size)
+        load_stored(path)
+        return None, lambda: load_stored(path), 1
+    return setup
+
+
+def spawn_case(count):
+    def setup():
+        # About twice as many free cells as enemies, like the rooms of a map
+        side = max(64, int(np.ceil(np.sqrt(2 * count))))
+        positions = np.argwhere(np.ones((side, side), dtype=bool))
+        return None, lambda: main.create_enemies(None, 1, count, positions, random.Random(SEED),
+                                                 np.random.RandomState(SEED)), 1
+    return setup
+
+
+for _size in GENERATE_SIZES:
+    case(f"generate/{_size}")(generate_case(_size))
+for _size in RENDER_SIZES:
+    case(f"render/miss/{_size}")(render_miss_case(_size))
+    case(f"render/hit/{_size}")(render_hit_case(_size))
+for _count in SPAWN_COUNTS:
+    case(f"spawn/{_count}")(spawn_case(_count))
+
+
+def new_game(seed=SEED):
+    game = main.Game(prepare_dungeon(None, render=False, rng=np.random.RandomState(seed)), render=False)
+    game.reseed(seed)
+    game.new_game("Bench", 1)
+    return game
+
+
+def play(game, actions):
+    for i, action in enumerate(actions):
+        main.play_event(game, {"a": action, "s": SEED + i})
+
+
+@case("turn/move")
+def move_case():
+    actions = random.Random(SEED).choices(main.directions, k=ACTIONS_PER_RUN)
+    games = []
+
+    def before():
+        games[:] = [new_game()]
+    return before, lambda: play(games[0], actions), len(actions)
+
+
+@case("turn/combat")
+def combat_case():
+    actions = random.Random(SEED).choices(('a', 'sp'), k=ACTIONS_PER_RUN)
+    games = []
+
+    def before():
+        game = new_game()
+        # Player next to the first enemy, both too tough to die during the run
+        enemy = game.enemies[0]
+        for dy, dx in main.side_steps:
+            y, x = enemy.y + dy, enemy.x + dx
+            if game.walkable_mask[y, x] and game.occupancy[y, x] < 0:
+                game.player.position = [y, x]
+                break
+        for being in (game.player, enemy):
+            being.hp = being.max_hp = 10 ** 9
+        game.update_current_enemy()
+        games[:] = [game]
+    return before, lambda: play(games[0], actions), len(actions)
+
+
+@case("state/full")
+def state_full_case():
+    game = new_game()
+    play(game, random.Random(SEED).choices(main.directions, k=20))
+    return None, lambda: json.dumps(game.get_state_dict()), 1
+
+
+@case("state/delta")
+def state_delta_case():
+    # One move, then the delta a polling client gets for it
+    game = new_game()
+    actions = random.Random(SEED).choices(main.directions, k=ACTIONS_PER_RUN)
+    _, baseline = game.state_delta()
+    state = [baseline]
+
+    def run():
+        for i, action in enumerate(actions):
+            main.play_event(game, {"a": action, "s": SEED + i})
+            delta, state[0] = game.state_delta(state[0])
+            json.dumps(delta)
+    return None, run, len(actions)
+
+
+# --- Runner ---
+
+def measure(setup, repeat, budget):
+    """ms per operation of every run: at least one run, then up to `repeat` within `budget` seconds."""
+    before, fn, ops = setup()
+    times = []
+    started = time.perf_counter()
+    while len(times) < repeat and (not times or time.perf_counter() - started < budget):
+        if before is not None:
+            before()
+        t = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t) / ops * 1e3)
+    return times
+
+
+def run_suite(pattern=None, repeat=7, budget=10.0, quick=False):
+    results = {}
+    for name, setup in CASES:
+        if (pattern and not re.search(pattern, name)) or (quick and name in QUICK_SKIP):
+            continue
+        times = measure(setup, repeat, budget)
+        results[name] = {
+            "min_ms": min(times),
+            "median_ms": statistics.median(times),
+            "mean_ms": statistics.fmean(times),
+            "runs": len(times),
+        }
+        print(f"{name:<18} {results[name]['median_ms']:>11.4f} ms  (min {min(times):.4f}, {len(times)} runs)")
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "seed": SEED,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "cases": results,
+    }
+
+
+def compare(results, baseline, threshold):
+    """Prints current vs baseline medians; returns the names of the cases that regressed."""
+    regressions = []
+    print(f"\n{'case':<18} {'baseline ms':>12} {'now ms':>12} {'change':>8}")
+    for name, now in results["cases"].items():
+        base = baseline["cases"].get(name)
+        if base is None:
+            print(f"{name:<18} {'-':>12} {now['median_ms']:>12.4f} {'new':>8}")
+            continue
+        ratio = now["median_ms"] / base["median_ms"] if base["median_ms"] else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            flag = "  faster"
+        print(f"{name:<18} {base['median_ms']:>12.4f} {now['median_ms']:>12.4f} {ratio - 1:>+8.0%}{flag}")
+    missing = sorted(set(baseline["cases"]) - set(results["cases"]))
+    if missing:
+        print(f"not run: {', '.join(missing)}")
+    return regressions
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--compare", metavar="BASELINE", help="flag cases slower than this results file")
+    parser.add_argument("--threshold", type=float, default=0.25, help="relative slowdown flagged as a regression")
+    parser.add_argument("--filter", help="only run cases whose name matches this regex")
+    parser.add_argument("--repeat", type=int, default=7, help="runs per case")
+    parser.add_argument("--budget", type=float, default=10.0, help="seconds per case before it stops repeating")
+    parser.add_argument("--quick", action="store_true", help=f"skip {', '.join(QUICK_SKIP)}")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    results = run_suite(args.filter, args.repeat, args.budget, args.quick)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.out}")
+    if baseline is not None and compare(results, baseline, args.threshold):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
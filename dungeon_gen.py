@@ -4,28 +4,39 @@ import cv2
 import numpy as np
 import os
 import hashlib
+import struct
+import threading
+import re
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from metrics import MAP_PHASES
 
 # --- Configuration ---
 
 # Mapping of cell types to colors (BGR - OpenCV default)
+# Bump PALETTE_VERSION whenever COLOR_MAP changes so cached renders are redone.
+PALETTE_VERSION = 1
+COLOR_MAP = [
+    (80, 80 , 80),     # 0 - Dark gray — empty space or background
+    (40, 60 , 120),    # 1 - Dark red/brown — regular doors
+    (80, 80 , 80),     # 2 - Dark gray — secret doors
+    (0, 0 , 200),      # 3 - Red — locked doors
+    (40, 60 , 120),    # 4 - Dark red/brown — trap doors
+    (0, 200 , 0),      # 5 - Green — stairs down
+    (200, 200 , 0),    # 6 - Cyan — stairs up
+    (120, 120 , 120),  # 7 - Medium gray — corridors
+    (150, 150 , 150),  # 8 - Light gray — room floor
+    (80, 80 , 80),     # 9 - Dark gray — walls
+]
+
 def map_to_rgb(map_array):
-    color_map = [
-        (80, 80 , 80),     # 0 - Dark gray — empty space or background
-        (40, 60 , 120),    # 1 - Dark red/brown — regular doors
-       (80, 80 , 80),     # 2 - Dark gray — secret doors
-        (0, 0 , 200),      # 3 - Red — locked doors
-       (40, 60 , 120),  # 4 - Dark red/brown — trap doors
-        (0, 200 , 0),      # 5 - Green — stairs down
-        (200, 200 , 0),    # 6 - Cyan — stairs up
-        (120, 120 , 120),  # 7 - Medium gray — corridors
-        (150, 150 , 150),  # 8 - Light gray — room floor
-        (80, 80 , 80),     # 9 - Dark gray — walls
-    ]
-    
     h, w = map_array.shape
     rgb = np.zeros((h, w, 3), dtype=np.uint8)
     
-    for idx, color in enumerate(color_map):
+    for idx, color in enumerate(COLOR_MAP):
         rgb[map_array == idx] = color
     return rgb
 
@@ -41,6 +52,30 @@ ROOM = 8
 WALL = 9
 
 
+# Compact on-disk map store: a fixed header followed by one uint8 per tile.
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MAP_DIR = os.path.join(SCRIPT_DIR, "maps")
+MAP_EXT = ".dlm"
+MAP_MAGIC = b"DLMP"
+MAP_VERSION = 1
+# magic, version, md5 id (raw), seed (-1 if unknown), height, width
+MAP_HEADER = struct.Struct("<4sB3x16sqII")
+
+MAP_PADDING = 4   # Empty cells added around the map before rendering
+# Rendered PNGs are looked up by (map id, cell size, padding, palette version)
+RENDER_INDEX = os.path.join(MAP_DIR, "render_index.json")
+_render_index = None
+_render_lock = threading.Lock()
+
+# Viewport tiles: TILE_SIZE² px PNGs, rendered on first request and kept on disk.
+# Zoom level z draws every cell as TILE_CELL_SIZES[z] px (z=0 matches the full render).
+TILE_SIZE = 256
+TILE_CELL_SIZES = (11, 4, 1)
+TILE_DIR = os.path.join(MAP_DIR, "tiles")
+OVERVIEW_MAX_PX = 2048  # Largest side of the single-image overview
+MIN_GRID_CELL = 4       # Grid lines are only drawn when cells are at least this big
+
+
 MIN_ROOM = 4      # Minimum inner room size
 MARGIN = 2        # Buffer around rooms
 MIN_LEAF = MIN_ROOM + MARGIN * 2 # Min partition size
@@ -55,11 +90,11 @@ class Node:
         self.left = self.right = None
         self.room = None # (rx, ry, rw, rh)
 
-    def split(self):
+    def split(self, rng=random):
         if self.left or self.right:
             return False
 
-        split_horizontally = random.choice((True, False))
+        split_horizontally = rng.choice((True, False))
         if self.w > self.h and self.w / self.h >= 1.25:
             split_horizontally = True
         elif self.h > self.w and self.h / self.w >= 1.25:
@@ -83,7 +118,7 @@ class Node:
             if not can_split_horizontally: return False # Double check
             max_split = self.w - MIN_LEAF
             if max_split < MIN_LEAF: return False
-            split_pos = random.randint(MIN_LEAF, max_split)
+            split_pos = rng.randint(MIN_LEAF, max_split)
             self.left = Node(self.x, self.y, split_pos, self.h)
             self.right = Node(self.x + split_pos, self.y, self.w - split_pos, self.h)
             return True
@@ -91,46 +126,46 @@ class Node:
             if not can_split_vertically: return False # Double check
             max_split = self.h - MIN_LEAF
             if max_split < MIN_LEAF: return False
-            split_pos = random.randint(MIN_LEAF, max_split)
+            split_pos = rng.randint(MIN_LEAF, max_split)
             self.left = Node(self.x, self.y, self.w, split_pos)
             self.right = Node(self.x, self.y + split_pos, self.w, self.h - split_pos)
             return True
 
 
-    def create_room(self, grid):
+    def create_room(self, grid, rng=random):
         if self.left or self.right:
             if self.left:
-                self.left.create_room(grid)
+                self.left.create_room(grid, rng)
             if self.right:
-                self.right.create_room(grid)
+                self.right.create_room(grid, rng)
             if self.left and self.right:
-                center1 = self.left.get_room_center()
-                center2 = self.right.get_room_center()
+                center1 = self.left.get_room_center(rng)
+                center2 = self.right.get_room_center(rng)
                 if center1 and center2:
-                    carve_corridor(grid, center1[0], center1[1], center2[0], center2[1])
+                    carve_corridor(grid, center1[0], center1[1], center2[0], center2[1], rng)
         else:
             # Leaf node: create a room
-            room_w = random.randint(MIN_ROOM, self.w - MARGIN)
-            room_h = random.randint(MIN_ROOM, self.h - MARGIN)
-            room_x = random.randint(self.x + MARGIN // 2, self.x + self.w - room_w - MARGIN // 2)
-            room_y = random.randint(self.y + MARGIN // 2, self.y + self.h - room_h - MARGIN // 2)
+            room_w = rng.randint(MIN_ROOM, self.w - MARGIN)
+            room_h = rng.randint(MIN_ROOM, self.h - MARGIN)
+            room_x = rng.randint(self.x + MARGIN // 2, self.x + self.w - room_w - MARGIN // 2)
+            room_y = rng.randint(self.y + MARGIN // 2, self.y + self.h - room_h - MARGIN // 2)
 
             grid[room_y : room_y + room_h, room_x : room_x + room_w] = ROOM
             self.room = (room_x, room_y, room_w, room_h)
 
-    def get_room_center(self):
+    def get_room_center(self, rng=random):
         if self.room:
             rx, ry, rw, rh = self.room
             return (rx + rw // 2, ry + rh // 2)
         else:
             center1, center2 = None, None
             if self.left:
-                center1 = self.left.get_room_center()
+                center1 = self.left.get_room_center(rng)
             if self.right:
-                center2 = self.right.get_room_center()
+                center2 = self.right.get_room_center(rng)
 
             if center1 and center2:
-                return random.choice((center1, center2))
+                return rng.choice((center1, center2))
             elif center1:
                 return center1
             elif center2:
@@ -138,7 +173,7 @@ class Node:
             else:
                 return None
 
-def carve_corridor(grid, x1, y1, x2, y2):
+def carve_corridor(grid, x1, y1, x2, y2, rng=random):
     # Carve L-shaped corridors, ensuring not to overwrite existing ROOMS
     cx, cy = x1, y1
     while cx != x2 or cy != y2:
@@ -152,7 +187,7 @@ def carve_corridor(grid, x1, y1, x2, y2):
             elif abs(y2 - cy) > abs(x2 - cx):
                 prefer_x = False
             else:
-                prefer_x = random.choice([True, False])
+                prefer_x = rng.choice([True, False])
         elif move_x:
             prefer_x = True
         else: # move_y must be true
@@ -174,17 +209,109 @@ def carve_corridor(grid, x1, y1, x2, y2):
 
 
 
-def is_near_special_door(grid, y, x, radius):
+def distance_to_tiles(grid, tiles):
+    """
+    Chebyshev distance from every cell to the nearest cell whose type is in
+    `tiles`, computed in a single distance-transform pass over the grid.
+    Cells of those types are at distance 0; if the grid has none of them
+    every cell is at np.inf.
+    """
+    target = np.isin(grid, tiles)
+    if not target.any():
+        return np.full(grid.shape, np.inf, dtype=np.float32)
+    return cv2.distanceTransform((~target).astype(np.uint8), cv2.DIST_C, 3)
+
+
+def eligible_cells(grid, radius, tile=ROOM, avoid=(LOCKED, SECRET), distance=None):
+    """
+    Boolean mask of `tile` cells with no `avoid` cell inside the
+    (2*radius+1)² square around them. Pass a precomputed `distance` map
+    (from distance_to_tiles) to test several radii or placement rules
+    without recomputing it.
+    """
+    if distance is None:
+        distance = distance_to_tiles(grid, avoid)
+    return (grid == tile) & (distance > radius)
+
+def door_mask(grid):
+    """
+    Returns a boolean mask of the CORRIDOR cells that become doors.
+
+    Whole-grid equivalent of scanning the interior cells in row-major order:
+    a corridor cell touching a ROOM on one side, a CORRIDOR on the opposite
+    side and WALLs on the other two is a door. Because the scan converts cells
+    as it goes, a cell whose only corridor neighbour (left or up) was turned
+    into a door just before it is skipped, which the last two terms replicate.
+    """
     h, w = grid.shape
-    y0, y1 = max(0, y - radius), min(h, y + radius + 1)
-    x0, x1 = max(0, x - radius), min(w, x + radius + 1)
-    subgrid = grid[y0:y1, x0:x1]
-    return np.any(np.isin(subgrid, [LOCKED, SECRET]))
+    mask = np.zeros((h, w), dtype=bool)
+    if h < 3 or w < 3:
+        return mask
+
+    c = grid[1:-1, 1:-1]
+    up, down = grid[:-2, 1:-1], grid[2:, 1:-1]
+    left, right = grid[1:-1, :-2], grid[1:-1, 2:]
+
+    corridor = c == CORRIDOR
+    walls_lr = (left == WALL) & (right == WALL)
+    walls_ud = (up == WALL) & (down == WALL)
+
+    v_room_up = corridor & walls_lr & (up == ROOM) & (down == CORRIDOR)
+    v_room_down = corridor & walls_lr & (down == ROOM) & (up == CORRIDOR)
+    h_room_left = corridor & walls_ud & (left == ROOM) & (right == CORRIDOR)
+    h_room_right = corridor & walls_ud & (right == ROOM) & (left == CORRIDOR)
+
+    # The up/left neighbour is only still a CORRIDOR if it did not become a
+    # door itself, which can only happen through the "room behind it" rule.
+    up_was_door = np.zeros_like(corridor)
+    up_was_door[1:] = v_room_up[:-1]
+    left_was_door = np.zeros_like(corridor)
+    left_was_door[:, 1:] = h_room_left[:, :-1]
+
+    mask[1:-1, 1:-1] = (v_room_up | h_room_left
+                        | (v_room_down & ~up_was_door)
+                        | (h_room_right & ~left_was_door))
+    return mask
+
+
+def place_doors(grid, fast=False, rng=random, np_rng=np.random):
+    """
+    Turns the cells selected by door_mask into doors, in place.
+
+    The default mode draws the door types from `rng` in row-major order,
+    so a given seed produces exactly the same doors as the original per-cell
+    loop. fast=True draws all types at once from `np_rng` instead: same
+    door cells and type probabilities, but a different map per seed.
+    """
+    ys, xs = np.nonzero(door_mask(grid))
+    if fast:
+        special = np_rng.random_sample(len(ys)) <= 0.16
+        kinds = np_rng.choice([SECRET, LOCKED, TRAPPED], size=len(ys))
+        grid[ys, xs] = np.where(special, kinds, DOOR)
+    else:
+        for y, x in zip(ys.tolist(), xs.tolist()):
+            grid[y, x] = DOOR if rng.random() > 0.16 else rng.choice([SECRET, LOCKED, TRAPPED])
+    return grid
+
 
-def generate_dungeon_json(seed, height, width ):
-    random.seed(seed)
-    np.random.seed(seed)
-    grid = np.full((height, width), WALL, dtype=np.int32)
+def dungeon_id(grid):
+    """md5 of the map shape and its raw uint8 tile plane."""
+    grid = np.ascontiguousarray(grid, dtype=np.uint8)
+    md5 = hashlib.md5(struct.pack("<II", *grid.shape))
+    md5.update(grid.data)
+    return md5.hexdigest()
+
+
+def generate_dungeon(seed, height, width, fast_doors=False):
+    """
+    Generates a dungeon; 'map' is a (height, width) uint8 array. All
+    randomness comes from generators private to this call, seeded with
+    `seed`, so it is safe to run concurrently and the same seed always gives
+    the same map.
+    """
+    rng = random.Random(seed)
+    np_rng = np.random.RandomState(seed)
+    grid = np.full((height, width), WALL, dtype=np.uint8)
 
     # --- BSP Split ---
     root = Node(0, 0, width, height)
@@ -193,53 +320,43 @@ def generate_dungeon_json(seed, height, width ):
 
     while nodes_to_split:
         node = nodes_to_split.pop(0)
-        if node.split():
+        if node.split(rng):
             nodes_to_split.extend([node.left, node.right])
         else:
             final_leaves.append(node)
 
     # --- Create Rooms & Corridors ---
-    root.create_room(grid)
+    root.create_room(grid, rng)
 
     # --- Place Doors ---
-    for y in range(1, height - 1):
-        for x in range(1, width - 1):
-            if grid[y, x] == CORRIDOR:
-                up, down = grid[y - 1, x], grid[y + 1, x]
-                left, right = grid[y, x - 1], grid[y, x + 1]
-
-                vertical = ((up == ROOM and down == CORRIDOR) or (down == ROOM and up == CORRIDOR)) \
-                           and left == WALL and right == WALL
-                horizontal = ((left == ROOM and right == CORRIDOR) or (right == ROOM and left == CORRIDOR)) \
-                             and up == WALL and down == WALL
-
-                if vertical or horizontal:
-                    grid[y, x] = DOOR if random.random() > 0.16 else random.choice([SECRET, LOCKED, TRAPPED])
+    place_doors(grid, fast=fast_doors, rng=rng, np_rng=np_rng)
 
     # --- Valid Stair Spots ---
     radius = 3
-    valid_stair_spots = [
-        (y, x) for y, x in zip(*np.where(grid == ROOM))
-        if not is_near_special_door(grid, y, x, radius)
-    ]
+    ys, xs = np.nonzero(eligible_cells(grid, radius))
+    valid_stair_spots = list(zip(ys.tolist(), xs.tolist()))
 
     # --- Place Stairs ---
     if len(valid_stair_spots) >= 2:
-        stair_up_pos, stair_down_pos = random.sample(valid_stair_spots, 2)
+        stair_up_pos, stair_down_pos = rng.sample(valid_stair_spots, 2)
         grid[stair_up_pos] = STAIR_UP
         grid[stair_down_pos] = STAIR_DOWN
 
-    grid = grid.tolist()
-    
     return {
-         'id': hashlib.md5(json.dumps(grid).encode('utf-8')).hexdigest(),
+         'id': dungeon_id(grid),
          'width': width,
          'height': height,
          'seed': seed,
-         'map': grid, 
+         'map': grid,
     }
 
 
+def generate_dungeon_json(seed, height, width, fast_doors=False):
+    dungeon = generate_dungeon(seed, height, width, fast_doors=fast_doors)
+    dungeon['map'] = dungeon['map'].tolist()
+    return dungeon
+
+
 def parse_dungeon_json(path_or_str):
     try:
         data = json.loads(path_or_str)
@@ -257,6 +374,65 @@ def save_dungeon_json(json_str):
     return filename
 
 
+def save_dungeon_bin(dungeon, directory=MAP_DIR):
+    """Writes a generated dungeon to '<directory>/<id>.dlm' and returns the path."""
+    grid = np.ascontiguousarray(dungeon['map'], dtype=np.uint8)
+    height, width = grid.shape
+    seed = dungeon.get('seed')
+    header = MAP_HEADER.pack(MAP_MAGIC, MAP_VERSION, bytes.fromhex(dungeon['id']),
+                             -1 if seed is None else int(seed), height, width)
+
+    os.makedirs(directory, exist_ok=True)
+    filename = os.path.join(directory, f"{dungeon['id']}{MAP_EXT}")
+    tmp_filename = f"{filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_filename, 'wb') as f:
+        f.write(header)
+        f.write(grid.data)
+    os.replace(tmp_filename, filename)
+    return filename
+
+
+def read_dungeon_header(path):
+    with open(path, 'rb') as f:
+        raw = f.read(MAP_HEADER.size)
+    if len(raw) < MAP_HEADER.size:
+        raise ValueError(f"'{path}' is not a dungeon map file.")
+    magic, version, raw_id, seed, height, width = MAP_HEADER.unpack(raw)
+    if magic != MAP_MAGIC:
+        raise ValueError(f"'{path}' is not a dungeon map file.")
+    if version != MAP_VERSION:
+        raise ValueError(f"Unsupported dungeon map version {version} in '{path}'.")
+    return {
+        'id': raw_id.hex(),
+        'seed': None if seed == -1 else seed,
+        'height': height,
+        'width': width,
+    }
+
+
+def parse_dungeon_bin(path):
+    """Returns (id, grid) with grid as a read-only np.memmap over the tile plane."""
+    header = read_dungeon_header(path)
+    grid = np.memmap(path, dtype=np.uint8, mode='r', offset=MAP_HEADER.size,
+                     shape=(header['height'], header['width']))
+    return header['id'], grid
+
+
+def is_dungeon_bin(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAP_MAGIC)) == MAP_MAGIC
+    except OSError:
+        return False
+
+
+def parse_dungeon(path):
+    """Loads a map saved in either the binary or the JSON format."""
+    if is_dungeon_bin(path):
+        return parse_dungeon_bin(path)
+    return parse_dungeon_json(path)
+
+
 
 # --- End of Configuration ---
 
@@ -333,39 +509,262 @@ def grid_numpy(image, rows, cols, cor=(0, 255, 0), espessura=1):
 
 
 
-def load_dungeon(json_path, rows, cols, seed, cell_size = 11, return_values = False):
-    height, width = rows, cols
-    if not os.path.exists(json_path):
-        values = generate_dungeon_json(seed, rows, cols)
-        save_dungeon_json(values)
-        height, width = values["height"], values["width"]
-        values = np.array(values["map"], dtype=np.int32).reshape(height, width)
-    else:
-        values = parse_dungeon_json(json_path)[1]
-        height, width = values.shape
-    
-    
-    values = pad_image(values, 4, 0)
+def render_dungeon(values, cell_size=11):
+    """Colourizes an (already padded) map, scales it by cell_size and draws the grid."""
+    height, width = values.shape
     image = map_to_rgb(values)
-    image = cv2.resize(image, ((width+8)*cell_size, (height+8)*cell_size), interpolation=cv2.INTER_AREA)
-    image = grid_numpy(image, height+8, width+8, cor=(0, 0, 0), espessura=1)
+    image = cv2.resize(image, (width*cell_size, height*cell_size), interpolation=cv2.INTER_AREA)
+    if cell_size < MIN_GRID_CELL:
+        return image
+    return grid_numpy(image, height, width, cor=(0, 0, 0), espessura=1)
+
+
+def overview_cell_size(shape, max_cell_size=11):
+    """Largest cell size (up to max_cell_size) that keeps the overview under OVERVIEW_MAX_PX."""
+    return max(1, min(max_cell_size, OVERVIEW_MAX_PX // max(shape)))
+
+
+def tile_grid(shape, z):
+    """Number of (columns, rows) of tiles covering a padded map at zoom level z."""
+    cell_size = TILE_CELL_SIZES[z]
+    height, width = shape
+    return -(-width * cell_size // TILE_SIZE), -(-height * cell_size // TILE_SIZE)
+
+
+def tile_cells(shape, z, tx, ty):
+    """
+    (cy0, cy1, cx0, cx1): the window of cells of a padded map of this shape
+    under tile (tx, ty) at zoom level z. Raises ValueError for a tile outside
+    the map.
+    """
+    cell_size = TILE_CELL_SIZES[z]
+    height, width = shape
+    y0, x0 = ty * TILE_SIZE, tx * TILE_SIZE
+    y1, x1 = min(y0 + TILE_SIZE, height * cell_size), min(x0 + TILE_SIZE, width * cell_size)
+    if tx < 0 or ty < 0 or y0 >= y1 or x0 >= x1:
+        raise ValueError(f"Tile ({tx}, {ty}) is outside the map at zoom level {z}.")
+    return y0 // cell_size, -(-y1 // cell_size), x0 // cell_size, -(-x1 // cell_size)
+
+
+def _cells_to_tile(cells, z, tx, ty, height, width):
+    # Scales a tile's cell window up to its pixels, cut to the tile's height x width
+    cell_size = TILE_CELL_SIZES[z]
+    oy, ox = ty * TILE_SIZE % cell_size, tx * TILE_SIZE % cell_size
+    return cells.repeat(cell_size, axis=0).repeat(cell_size, axis=1)[oy:oy + height, ox:ox + width]
+
+
+def _draw_tile_grid(image, z, tx, ty):
+    cell_size = TILE_CELL_SIZES[z]
+    if cell_size >= MIN_GRID_CELL:
+        # Same lines as grid_numpy: one pixel at every inner cell boundary
+        rows = np.arange(ty * TILE_SIZE, ty * TILE_SIZE + image.shape[0])
+        cols = np.arange(tx * TILE_SIZE, tx * TILE_SIZE + image.shape[1])
+        image[(rows % cell_size == 0) & (rows > 0)] = 0
+        image[:, (cols % cell_size == 0) & (cols > 0)] = 0
+
+
+def render_tile(values, z, tx, ty):
+    """
+    Renders tile (tx, ty) of a padded map at zoom level z. Only the cells under
+    the tile are colourized, so the cost does not depend on the map size. At
+    z=0 the pixels are identical to the same window of render_dungeon.
+    """
+    cell_size = TILE_CELL_SIZES[z]
+    height, width = values.shape
+    cy0, cy1, cx0, cx1 = tile_cells(values.shape, z, tx, ty)
+    tile_height = min(TILE_SIZE, height * cell_size - ty * TILE_SIZE)
+    tile_width = min(TILE_SIZE, width * cell_size - tx * TILE_SIZE)
+    cells = np.asarray(COLOR_MAP, dtype=np.uint8)[values[cy0:cy1, cx0:cx1]]
+    image = np.ascontiguousarray(_cells_to_tile(cells, z, tx, ty, tile_height, tile_width))
+    _draw_tile_grid(image, z, tx, ty)
+    return image
+
+
+def map_store_path(map_id, directory=MAP_DIR):
+    return os.path.join(directory, f"{map_id}{MAP_EXT}")
+
+
+@lru_cache(maxsize=16)
+def load_stored_map(map_id):
+    """Padded tile array of a map in the store; cached and shared, so read-only."""
+    values = pad_image(parse_dungeon_bin(map_store_path(map_id))[1], MAP_PADDING, 0)
+    values.setflags(write=False)
+    return values
+
+
+def get_tile(map_id, z, tx, ty):
+    """
+    Returns the path of a tile PNG for a map in the store, rendering it on
+    first request. Raises ValueError for an unknown map or out-of-range tile.
+    """
+    if not re.fullmatch(r"[0-9a-f]{32}", map_id):
+        raise ValueError(f"Invalid map id '{map_id}'.")
+    if not 0 <= z < len(TILE_CELL_SIZES):
+        raise ValueError(f"Invalid zoom level {z}.")
+
+    tile_path = os.path.join(TILE_DIR, map_id, f"p{PALETTE_VERSION}", str(z), f"{tx}_{ty}.png")
+    if os.path.exists(tile_path):
+        return tile_path
+
+    if not os.path.exists(map_store_path(map_id)):
+        raise ValueError(f"Map '{map_id}' is not in the map store.")
+    columns, rows = tile_grid(load_stored_map(map_id).shape, z)
+    if not (0 <= tx < columns and 0 <= ty < rows):
+        raise ValueError(f"Tile ({tx}, {ty}) is outside the map at zoom level {z}.")
+
+    with MAP_PHASES.time("tile"):
+        image = render_tile(load_stored_map(map_id), z, tx, ty)
+        os.makedirs(os.path.dirname(tile_path), exist_ok=True)
+        write_png(tile_path, image)
+    return tile_path
+
+
+@lru_cache(maxsize=128)
+def load_tile(map_id, z, tx, ty):
+    """Pixels of a tile from get_tile; cached and shared, so read-only."""
+    image = cv2.imread(get_tile(map_id, z, tx, ty), cv2.IMREAD_COLOR)
+    if image is None:
+        raise OSError(f"Could not read tile ({tx}, {ty}) of map '{map_id}' at zoom level {z}")
+    image.setflags(write=False)
+    return image
+
+
+def fog_tile(image, explored, z, tx, ty):
+    """
+    Copy of tile (tx, ty) at zoom level z with every cell that is False in
+    `explored`, the tile's window from tile_cells, drawn as EMPTY. The pixels
+    are the same as render_tile of the map with those cells set to EMPTY.
+    """
+    hidden = _cells_to_tile(~explored, z, tx, ty, *image.shape[:2])
+    image = image.copy()
+    image[hidden] = COLOR_MAP[EMPTY]
+    _draw_tile_grid(image, z, tx, ty)
+    return image
+
+
+_COLOR_LUT = np.zeros((256, 1, 3), dtype=np.uint8)
+_COLOR_LUT[:len(COLOR_MAP), 0] = COLOR_MAP
+
+
+def map_pixels(values):
+    """One pixel per cell of a map, coloured like map_to_rgb but in a single cv2.LUT pass."""
+    index = np.ascontiguousarray(values, dtype=np.uint8)
+    return cv2.LUT(cv2.merge([index, index, index]), _COLOR_LUT)
+
+
+def encode_png(image):
+    ok, encoded = cv2.imencode(".png", image)
+    if not ok:
+        raise OSError("Could not encode the image as PNG")
+    return encoded.tobytes()
+
+
+def write_png(path, image):
+    """Encodes to a temporary file first so readers never see a partial PNG."""
+    data = encode_png(image)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _load_render_index():
+    global _render_index
+    if _render_index is None:
+        try:
+            with open(RENDER_INDEX, 'r', encoding='utf-8') as f:
+                _render_index = json.load(f)
+        except (OSError, ValueError):
+            _render_index = {}
+    return _render_index
+
+
+def cached_render(map_id, cell_size=11, padding=MAP_PADDING):
+    """Returns the cached PNG path for this map/cell size/padding/palette, or None."""
+    key = f"{map_id}:{cell_size}:{padding}:{PALETTE_VERSION}"
+    with _render_lock:
+        output_filename = _load_render_index().get(key)
+    if output_filename and os.path.exists(os.path.join(SCRIPT_DIR, output_filename)):
+        return output_filename
+    return None
+
+
+def _index_render(map_id, cell_size, padding, output_filename):
+    key = f"{map_id}:{cell_size}:{padding}:{PALETTE_VERSION}"
+    with _render_lock:
+        index = _load_render_index()
+        # Merge with entries written by other processes since we loaded it
+        try:
+            with open(RENDER_INDEX, 'r', encoding='utf-8') as f:
+                index.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+        index[key] = output_filename
+        os.makedirs(MAP_DIR, exist_ok=True)
+        tmp_index = f"{RENDER_INDEX}.{os.getpid()}.tmp"
+        with open(tmp_index, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(tmp_index, RENDER_INDEX)
+
+
+def load_dungeon(json_path, rows, cols, seed, cell_size = 11, return_values = False, return_id = False, render = True,
+                 overview = True):
+    """
+    Loads (or generates) a map and renders its overview PNG. cell_size=None
+    picks one with overview_cell_size. With return_values the padded map and
+    the PNG path are returned, plus the map id if return_id is also set.
+    json_path=None always generates. overview=False saves the map to the
+    store but renders no PNG, and render=False is headless: nothing is
+    rendered or saved. Either way the PNG path is None.
+    """
+    if json_path is None or not os.path.exists(json_path):
+        with MAP_PHASES.time("generate"):
+            values = generate_dungeon(seed, rows, cols)
+        if render:
+            save_dungeon_bin(values)
+        map_id, values = values["id"], values["map"]
+    else:
+        values = parse_dungeon(json_path)[1]
+        map_id = dungeon_id(values)
+        # Tiles are served from the store, so keep a binary copy of every loaded map
+        if render and not os.path.exists(map_store_path(map_id)):
+            save_dungeon_bin({'id': map_id, 'seed': None, 'map': values})
+
+    values = pad_image(values, MAP_PADDING, 0)
+    if not (render and overview):
+        if return_values:
+            return (values, None, map_id) if return_id else (values, None)
+        return
+    if cell_size is None:
+        cell_size = overview_cell_size(values.shape)
+
+    # Render cache hit: skip colourizing/resizing entirely
+    output_filename = cached_render(map_id, cell_size)
+    if output_filename is not None:
+        if return_values:
+            return (values, output_filename, map_id) if return_id else (values, output_filename)
+        print(f"The image for map {map_id} already exists as '{output_filename}'.")
+        return
+
+    with MAP_PHASES.time("render"):
+        image = render_dungeon(values, cell_size)
 
     md5_hash = hashlib.md5(image.tobytes()).hexdigest()
     output_filename = f"./maps/{md5_hash}.png"
-    
+    full_output_path = os.path.join(SCRIPT_DIR, output_filename)
 
-    if os.path.exists(output_filename):
+    if os.path.exists(full_output_path):
+        _index_render(map_id, cell_size, MAP_PADDING, output_filename)
         if return_values:
-            return values, output_filename
+            return (values, output_filename, map_id) if return_id else (values, output_filename)
         print(f"The image with hash {md5_hash} already exists as '{output_filename}'.")
         return
 
     try:
         # Script path
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        full_output_path = os.path.join(script_dir, output_filename)
-        cv2.imwrite(full_output_path, image)
+        write_png(full_output_path, image)
         print(f"Dungeon image saved as '{full_output_path}'")
+        _index_render(map_id, cell_size, MAP_PADDING, output_filename)
     except Exception:
         # Fallback: try saving in current directory
         try:
@@ -374,14 +773,54 @@ def load_dungeon(json_path, rows, cols, seed, cell_size = 11, return_values = Fa
         except Exception as e_fallback:
             print(f"Error saving image: {e_fallback}")
     if return_values:
-        return values, output_filename
+        return (values, output_filename, map_id) if return_id else (values, output_filename)
+
+
+
+def _generate_and_save(job):
+    seed, height, width, directory, fast_doors = job
+    dungeon = generate_dungeon(seed, height, width, fast_doors=fast_doors)
+    save_dungeon_bin(dungeon, directory)
+    return seed, dungeon['id']
 
 
+def generate_batch(seeds, height, width, workers=None, directory=MAP_DIR, fast_doors=False, chunksize=16):
+    """
+    Generates one map per seed into the binary store, spread over a process
+    pool (workers=1 runs serially in this process). Returns {seed: map id};
+    since every map only depends on its own seed, the result is the same for
+    any number of workers.
+    """
+    jobs = [(seed, height, width, directory, fast_doors) for seed in seeds]
+    if workers == 1:
+        return dict(map(_generate_and_save, jobs))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return dict(executor.map(_generate_and_save, jobs, chunksize=chunksize))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Dungeon map generator.")
+    sub = parser.add_subparsers(dest="command")
+    batch = sub.add_parser("batch", help="generate many seeds into the map store")
+    batch.add_argument("--count", type=int, default=1000, help="number of maps")
+    batch.add_argument("--start-seed", type=int, default=0, help="first seed (seeds are consecutive)")
+    batch.add_argument("--size", type=int, nargs=2, default=(100, 100), metavar=("ROWS", "COLS"))
+    batch.add_argument("--workers", type=int, default=None, help="processes (default: CPU count)")
+    batch.add_argument("--out", default=MAP_DIR, help="map store directory")
+    batch.add_argument("--fast-doors", action="store_true", help="use place_doors(fast=True)")
+    args = parser.parse_args(argv)
+
+    if args.command != "batch":
+        load_dungeon("blahblah", 88, 88, np.random.randint(16777216))
+        return
+
+    seeds = range(args.start_seed, args.start_seed + args.count)
+    start = time.perf_counter()
+    ids = generate_batch(seeds, args.size[0], args.size[1], args.workers, args.out, args.fast_doors)
+    elapsed = time.perf_counter() - start
+    print(f"Generated {len(ids)} maps of {args.size[0]}x{args.size[1]} into '{args.out}' "
+          f"in {elapsed:.2f}s ({len(ids) / elapsed:.1f} maps/s)")
+
 
 if __name__ == "__main__":
-    
-    load_dungeon("blahblah", 88, 88, np.random.randint(16777216)) 
-    
-          
-         
-         
\ No newline at end of file
+    main()
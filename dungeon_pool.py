@@ -0,0 +1,203 @@
+import hashlib
+import os
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+import dungeon_gen as dgen
+
+
+class PreparedDungeon:
+    """A generated map plus the indexes a new Game needs."""
+    __slots__ = ('map', 'map_id', 'traps', 'start_position', 'room_cells')
+
+    def __init__(self, map, map_id):
+        self.map = map
+        self.map_id = map_id
+        self.traps = np.argwhere(map == dgen.TRAPPED)
+        stairs_up = np.argwhere(map == dgen.STAIR_UP)
+        self.start_position = stairs_up[0].tolist() if len(stairs_up) else None
+        self.room_cells = np.argwhere(map == dgen.ROOM)
+
+
+def prepare_dungeon(json_path, min_size=35, max_size=101, render=True, rng=np.random):
+    """
+    Loads json_path if it exists (None always generates), else generates a
+    random-size map, and keeps it in the map store its tiles are rendered
+    from. No overview PNG is rendered: players only get the fogged one from
+    main.fogged_map. With render=False nothing is written to disk (headless
+    games).
+    """
+    values, _, map_id = dgen.load_dungeon(
+        json_path, rng.randint(min_size, max_size), rng.randint(min_size, max_size),
+        rng.randint(16777216), return_values=True, return_id=True, render=render, overview=False)
+    return PreparedDungeon(np.asarray(values), map_id)
+
+
+class DungeonPool:
+    """
+    Bounded queue of ready-to-use dungeons, refilled in the background.
+
+    get() never waits for the producer: it pops a prepared dungeon if one is
+    ready (a hit) or builds one inline (a miss). The producer runs `factory`
+    in a daemon thread, or in a single worker process if use_processes is
+    set, in which case `factory` must be picklable. With start=False the
+    producer only starts on start() or the first get().
+    """
+
+    def __init__(self, factory, size=4, use_processes=False, start=True):
+        self.factory = factory
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._queue = queue.Queue(maxsize=size)
+        self._stopped = threading.Event()
+        self._stats_lock = threading.Lock()
+        self._executor = ProcessPoolExecutor(max_workers=1) if use_processes else None
+        self._thread = threading.Thread(target=self._produce, name="dungeon-pool", daemon=True)
+        self._start_lock = threading.Lock()
+        if start:
+            self.start()
+
+    def start(self):
+        with self._start_lock:
+            if not self._thread.is_alive() and not self._stopped.is_set():
+                self._thread.start()
+
+    def _produce(self):
+        while not self._stopped.is_set():
+            try:
+                if self._executor is not None:
+                    dungeon = self._executor.submit(self.factory).result()
+                else:
+                    dungeon = self.factory()
+            except Exception as e:
+                print(f"Dungeon pool failed to prepare a dungeon: {e}")
+                self._stopped.wait(1.0)
+                continue
+            # Re-check periodically so close() does not hang on a full queue
+            while not self._stopped.is_set():
+                try:
+                    self._queue.put(dungeon, timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
+
+    def get(self):
+        if not self._thread.is_alive():
+            self.start()
+        try:
+            dungeon = self._queue.get_nowait()
+        except queue.Empty:
+            with self._stats_lock:
+                self.misses += 1
+            return self.factory()
+        with self._stats_lock:
+            self.hits += 1
+        return dungeon
+
+    def stats(self):
+        with self._stats_lock:
+            return {"ready": self._queue.qsize(), "size": self.size, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=5)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def floor_seed(parent_map_id, depth):
+    """Seed of floor `depth`, the one under map parent_map_id: same parent, same floor."""
+    return int(hashlib.md5(f"{parent_map_id}/{depth}".encode()).hexdigest()[:8], 16)
+
+
+class FloorCache:
+    """
+    Floors below the ones being played. A floor only depends on the map above
+    it (see floor_seed), so it can be prepared in the background as soon as
+    that map is in play, and replays get the same one.
+
+    prefetch() queues a floor on a single worker thread, get() returns it,
+    waiting for a prefetch already running or building it inline if it was
+    not prefetched. At most max_resident prepared floors are held in memory;
+    the oldest are dropped and, when asked for again, reloaded from the binary
+    map store (rendered floors are saved there) or regenerated (headless).
+    """
+
+    def __init__(self, max_resident=8, max_stored=4096):
+        self.max_resident = max_resident
+        self.max_stored = max_stored
+        self.hits = 0
+        self.misses = 0
+        self._resident = OrderedDict()  # (parent id, depth, render) -> Future of a PreparedDungeon
+        self._stored = OrderedDict()  # (parent id, depth) -> map id of dropped floors
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="floor-prefetch")
+
+    def prefetch(self, parent_map_id, depth, render=True):
+        key = (parent_map_id, depth, render)
+        with self._lock:
+            if key in self._resident:
+                self._resident.move_to_end(key)
+                return
+            self._resident[key] = self._executor.submit(self._prepare, parent_map_id, depth, render)
+            self._evict_locked()
+
+    def get(self, parent_map_id, depth, render=True):
+        key = (parent_map_id, depth, render)
+        with self._lock:
+            future = self._resident.get(key)
+            if future is not None:
+                self._resident.move_to_end(key)
+        # A prefetch still queued behind others is cancelled and built right here
+        if future is not None and not future.cancel():
+            try:
+                dungeon = future.result()
+                with self._lock:
+                    self.hits += 1
+                return dungeon
+            except Exception as e:
+                print(f"Floor prefetch failed, preparing it again: {e}")
+
+        dungeon = self._prepare(parent_map_id, depth, render)
+        done = Future()
+        done.set_result(dungeon)
+        with self._lock:
+            self.misses += 1
+            self._resident[key] = done
+            self._evict_locked()
+        return dungeon
+
+    def _prepare(self, parent_map_id, depth, render):
+        with self._lock:
+            map_id = self._stored.get((parent_map_id, depth))
+        if render and map_id is not None and os.path.exists(dgen.map_store_path(map_id)):
+            return prepare_dungeon(dgen.map_store_path(map_id))
+        return prepare_dungeon(None, render=render, rng=np.random.RandomState(floor_seed(parent_map_id, depth)))
+
+    def _evict_locked(self):
+        # Oldest finished floors first; floors still being prepared stay
+        for key in list(self._resident):
+            if len(self._resident) <= self.max_resident:
+                break
+            future = self._resident[key]
+            if not future.done():
+                continue
+            del self._resident[key]
+            if key[2] and not future.cancelled() and future.exception() is None:
+                self._stored[key[:2]] = future.result().map_id
+                if len(self._stored) > self.max_stored:
+                    self._stored.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"resident": len(self._resident), "stored": len(self._stored),
+                    "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,175 @@
+import numpy as np
+
+# Same order as main.directions / main.sides
+DIRECTIONS = ('n', 'e', 's', 'w')
+SIDES = np.array([[-1, 0], [0, 1], [1, 0], [0, -1]], dtype=np.int32)
+
+
+class EnemyStore:
+    """
+    Struct-of-arrays storage for NPCs: positions, facing, hp and stats live in
+    numpy arrays indexed by the enemy's n, so a whole turn of NPC movement is
+    a handful of vectorized operations instead of one Python call per enemy.
+    """
+
+    def __init__(self, enemies):
+        count = max((e.n for e in enemies), default=-1) + 1
+        self.names = [None] * count
+        self.cn = np.zeros(count, dtype=np.int32)
+        self.position = np.zeros((count, 2), dtype=np.int32)
+        self.facing = np.zeros(count, dtype=np.int8)
+        self.hp = np.zeros(count, dtype=np.int64)
+        self.max_hp = np.zeros(count, dtype=np.int64)
+        self.defense = np.zeros(count, dtype=np.int64)
+        self.attack_power = np.zeros(count, dtype=np.int64)
+        self.special_power = np.zeros(count, dtype=np.int64)
+        self.alive = np.zeros(count, dtype=bool)
+
+        for e in enemies:
+            n = e.n
+            self.names[n] = e.name
+            self.cn[n] = e.cn
+            self.position[n] = e.position
+            self.facing[n] = DIRECTIONS.index(e.facing)
+            self.hp[n] = e.hp
+            self.max_hp[n] = e.max_hp
+            self.defense[n] = e.defense
+            self.attack_power[n] = e.attack_power
+            self.special_power[n] = e.special_power
+            self.alive[n] = True
+
+    def views(self):
+        """Being-like objects over the live enemies, in n order."""
+        return [StoredEnemy(self, n) for n in np.flatnonzero(self.alive).tolist()]
+
+    def kill(self, n):
+        self.alive[n] = False
+
+    def step(self, walkable_mask, occupancy, player_position, rng=np.random, flow=None):
+        """
+        Moves every live NPC one random step (or, inside flow, its step
+        towards the player, see pathfinding.FlowField), with the same rules
+        as calling Being.move_being on each of them in n order: a move
+        succeeds if the target is walkable, is not the player, and is free at
+        that enemy's turn, i.e. not held by a higher-n enemy (it has not moved
+        yet), by a lower-n enemy that stayed, or by a lower-n enemy that moved
+        into it.
+
+        Those rules only look at lower n, so iterating them from "nobody
+        moves" reaches the sequential outcome after at most chain-length
+        passes (usually two or three). occupancy is updated in place.
+        Returns the n of the enemies that moved.
+        """
+        ns = np.flatnonzero(self.alive)
+        if len(ns) == 0:
+            return ns
+        draws = rng.randint(0, 4, size=len(ns))
+        old = self.position[ns]
+        if flow is not None:
+            chase = flow.directions(old[:, 0], old[:, 1])
+            draws = np.where(chase >= 0, chase, draws)
+        target = old + SIDES[draws]
+        ty, tx = target[:, 0], target[:, 1]
+
+        py, px = player_position
+        allowed = walkable_mask[ty, tx] & ~((ty == py) & (tx == px))
+        occupant = occupancy[ty, tx]
+        allowed &= ~(occupant > ns)  # higher n has not moved away yet
+
+        has_lower = (occupant >= 0) & (occupant < ns)
+        flat_target = ty.astype(np.int64) * occupancy.shape[1] + tx
+        moved_by_n = np.zeros(len(self.alive), dtype=bool)
+        moved = np.zeros(len(ns), dtype=bool)
+        for _ in range(len(ns) + 1):
+            blocked = has_lower & ~moved_by_n[np.where(has_lower, occupant, 0)]
+            # Cells already claimed by a lower n that moved (ns is ascending,
+            # so np.unique's first index is the lowest claimant)
+            claimed, first = np.unique(flat_target[moved], return_index=True)
+            claimant = ns[moved][first]
+            slot = np.searchsorted(claimed, flat_target).clip(max=max(len(claimed) - 1, 0))
+            if len(claimed):
+                blocked |= (claimed[slot] == flat_target) & (claimant[slot] < ns)
+            new_moved = allowed & ~blocked
+            if np.array_equal(new_moved, moved):
+                break
+            moved = new_moved
+            moved_by_n[ns] = moved
+
+        movers = ns[moved]
+        occupancy[old[moved, 0], old[moved, 1]] = -1
+        occupancy[ty[moved], tx[moved]] = movers
+        self.position[movers] = target[moved]
+        self.facing[movers] = draws[moved]
+        return movers
+
+
+class StoredEnemy:
+    """Being-compatible view of one enemy in an EnemyStore."""
+    __slots__ = ('store', 'n')
+    is_player = False
+
+    def __init__(self, store, n):
+        self.store = store
+        self.n = n
+
+    @property
+    def name(self):
+        return self.store.names[self.n]
+
+    @property
+    def cn(self):
+        return int(self.store.cn[self.n])
+
+    @property
+    def hp(self):
+        return int(self.store.hp[self.n])
+
+    @hp.setter
+    def hp(self, value):
+        self.store.hp[self.n] = value
+
+    @property
+    def max_hp(self):
+        return int(self.store.max_hp[self.n])
+
+    @property
+    def defense(self):
+        return int(self.store.defense[self.n])
+
+    @property
+    def attack_power(self):
+        return int(self.store.attack_power[self.n])
+
+    @property
+    def special_power(self):
+        return int(self.store.special_power[self.n])
+
+    @property
+    def position(self):
+        return self.store.position[self.n].tolist()
+
+    @property
+    def facing(self):
+        return DIRECTIONS[self.store.facing[self.n]]
+
+    def get_dict(self, map=None):
+        return {
+            "n"  : self.n,
+            "name": self.name,
+            "class_number": self.cn,
+            "hp": self.hp,
+            "max_hp": self.max_hp,
+            "def": self.defense,
+            "atk": self.attack_power,
+            "special": self.special_power,
+            "position": self.position,
+            "facing": self.facing
+        }
+
+    def is_alive(self):
+        return self.hp > 0
+
+    def take_damage(self, damage):
+        actual_damage = max(0, int(damage))
+        self.hp = max(0, self.hp - actual_damage)
+        return actual_damage
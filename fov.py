@@ -0,0 +1,116 @@
+import base64
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import dungeon_gen as dgen
+
+# Tiles that stop sight: walls, unexplored rock and every kind of door
+OPAQUE_TILES = (dgen.EMPTY, dgen.WALL, dgen.SECRET, dgen.DOOR, dgen.LOCKED, dgen.TRAPPED)
+
+# (xx, xy, yx, yy) transforms from the first octant to each of the eight
+OCTANTS = ((1, 0, 0, 1), (0, 1, 1, 0), (0, -1, 1, 0), (-1, 0, 0, 1),
+           (-1, 0, 0, -1), (0, -1, -1, 0), (0, 1, -1, 0), (1, 0, 0, -1))
+
+CACHE_SIZE = 4096  # views kept, a radius 6 view is a 13x13 bool window
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def opaque_mask(map):
+    return np.isin(map, OPAQUE_TILES)
+
+
+def shadowcast(opaque, origin, radius):
+    """
+    Cells visible from origin within Euclidean `radius`, by recursive
+    shadowcasting: each octant is scanned row by row outwards, and an opaque
+    cell narrows the range of slopes still lit behind it. Opaque cells that
+    are lit are visible themselves (walls and doors show), and cells off the
+    map count as opaque.
+
+    Returns (visible, (y0, x0)): a bool window of the map, the square of the
+    radius around origin cut to the map, and its origin in the map.
+    """
+    oy, ox = int(origin[0]), int(origin[1])
+    h, w = opaque.shape
+    y0, x0 = max(oy - radius, 0), max(ox - radius, 0)
+    y1, x1 = min(oy + radius + 1, h), min(ox + radius + 1, w)
+    # Square window centred on origin, off-map cells padded as opaque
+    size = 2 * radius + 1
+    window = np.ones((size, size), dtype=bool)
+    wy, wx = y0 - (oy - radius), x0 - (ox - radius)
+    window[wy:wy + y1 - y0, wx:wx + x1 - x0] = opaque[y0:y1, x0:x1]
+    blocks = window.tolist()
+    lit = [[False] * size for _ in range(size)]
+    lit[radius][radius] = True
+    for octant in OCTANTS:
+        _cast(blocks, lit, radius, 1, 1.0, 0.0, octant)
+    visible = np.array(lit, dtype=bool)[wy:wy + y1 - y0, wx:wx + x1 - x0]
+    return visible, (y0, x0)
+
+
+def _cast(blocks, lit, radius, row, start, end, octant):
+    # Lights the cells of one octant between slopes start > end, from `row` outwards
+    if start < end:
+        return
+    xx, xy, yx, yy = octant
+    r2 = radius * radius
+    new_start = start
+    for j in range(row, radius + 1):
+        blocked = False
+        dy = -j
+        for dx in range(-j, 1):
+            left, right = (dx - 0.5) / (dy + 0.5), (dx + 0.5) / (dy - 0.5)
+            if start < right:
+                continue
+            if end > left:
+                break
+            x = radius + dx * xx + dy * xy
+            y = radius + dx * yx + dy * yy
+            if dx * dx + dy * dy <= r2:
+                lit[y][x] = True
+            if blocked:
+                if blocks[y][x]:
+                    new_start = right
+                else:
+                    blocked = False
+                    start = new_start
+            elif blocks[y][x] and j < radius:
+                blocked = True
+                _cast(blocks, lit, radius, j + 1, start, left, octant)
+                new_start = right
+        if blocked:
+            break
+
+
+def field_of_view(map_id, opaque, position, radius):
+    """
+    shadowcast() memoized per (map_id, position, radius), shared by every
+    game on that map. The returned window is read-only.
+    """
+    key = (map_id, int(position[0]), int(position[1]), radius)
+    with _cache_lock:
+        view = _cache.get(key)
+        if view is not None:
+            _cache.move_to_end(key)
+            return view
+    view = shadowcast(opaque, position, radius)
+    view[0].flags.writeable = False
+    with _cache_lock:
+        _cache[key] = view
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return view
+
+
+def encode_bits(mask):
+    """Base64 of the row-major bits of a bool array, first cell in the high bit (np.packbits)."""
+    return base64.b64encode(np.packbits(mask, axis=None).tobytes()).decode("ascii")
+
+
+def encode_view(view):
+    visible, origin = view
+    return {"origin": list(origin), "shape": list(visible.shape), "bits": encode_bits(visible)}
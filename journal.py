@@ -0,0 +1,140 @@
+import json
+import os
+import pickle
+import re
+import threading
+import time
+
+# Session tokens come from secrets.token_urlsafe; anything else is not a journal name
+TOKEN_PATTERN = re.compile(r"[A-Za-z0-9_-]{8,64}")
+FILE_PATTERN = re.compile(r"([A-Za-z0-9_-]{8,64})\.(jnl|snap|base\.snap)")
+
+
+class Journal:
+    """
+    Append-only log of the actions accepted for one session, plus snapshots.
+
+    Each event is one JSON line carrying a sequence number 'i', the action and
+    the seed its random draws were made with, so replaying the events on the
+    state they started from reproduces every roll. Every snapshot_every
+    events the whole Game is pickled to '<token>.snap' (tagged with the last
+    sequence number it includes); restore() loads that and replays only the
+    newer events. '<token>.base.snap' keeps the starting state so a session
+    can also be replayed from scratch when debugging.
+
+    Nothing is written until start() is called with the state the first
+    event applies to, so sessions that never act leave no files.
+    """
+
+    def __init__(self, directory, token, snapshot_every=50, seq=0):
+        if not TOKEN_PATTERN.fullmatch(token):
+            raise ValueError(f"Invalid session token '{token}'.")
+        self.directory = directory
+        self.token = token
+        self.snapshot_every = snapshot_every
+        self.seq = seq
+        self.since_snapshot = 0
+        self.started = False
+        self.journal_path = os.path.join(directory, f"{token}.jnl")
+        self.snapshot_path = os.path.join(directory, f"{token}.snap")
+        self.base_path = os.path.join(directory, f"{token}.base.snap")
+
+    @classmethod
+    def exists(cls, directory, token):
+        return bool(token) and TOKEN_PATTERN.fullmatch(token) is not None \
+            and os.path.exists(os.path.join(directory, f"{token}.snap"))
+
+    @classmethod
+    def restore(cls, directory, token, replay, snapshot_every=50, from_base=False):
+        """
+        Rebuilds a session's Game: loads the latest snapshot (or the base one)
+        and calls replay(game, event) for each later event. Returns
+        (game, journal) with the journal ready to keep appending.
+        """
+        journal = cls(directory, token, snapshot_every)
+        with open(journal.base_path if from_base else journal.snapshot_path, 'rb') as f:
+            seq, game = pickle.load(f)
+        for event in journal.events(after=seq):
+            replay(game, event)
+            seq = event["i"]
+            journal.since_snapshot += 1
+        journal.seq = seq
+        journal.started = True
+        return game, journal
+
+    @classmethod
+    def sweep(cls, directory, max_age, keep=()):
+        """
+        Deletes the files of every session whose newest file is older than
+        max_age seconds, except the tokens in keep. Returns the number of
+        sessions removed.
+        """
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return 0
+        newest, files = {}, {}
+        for name in names:
+            match = FILE_PATTERN.fullmatch(name)
+            if match is None or match.group(1) in keep:
+                continue
+            path = os.path.join(directory, name)
+            try:
+                mtime = os.path.getmtime(path)
+            except FileNotFoundError:
+                continue
+            token = match.group(1)
+            newest[token] = max(newest.get(token, 0), mtime)
+            files.setdefault(token, []).append(path)
+        cutoff = time.time() - max_age
+        expired = [token for token, mtime in newest.items() if mtime < cutoff]
+        for token in expired:
+            for path in files[token]:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        return len(expired)
+
+    def start(self, game):
+        """Writes the base snapshot of game, the state before the first event. Later calls do nothing."""
+        if self.started:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._write_snapshot(self.base_path, game)
+        self.snapshot(game)
+        self.started = True
+
+    def events(self, after=0):
+        try:
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        break  # torn last line after a crash
+                    if event["i"] > after:
+                        yield event
+        except FileNotFoundError:
+            return
+
+    def record(self, event, game):
+        """Appends an already applied event and snapshots game when due."""
+        self.seq += 1
+        line = json.dumps(dict(event, i=self.seq), separators=(',', ':'))
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            f.write(line + "\n")
+        self.since_snapshot += 1
+        if self.since_snapshot >= self.snapshot_every:
+            self.snapshot(game)
+
+    def snapshot(self, game):
+        self._write_snapshot(self.snapshot_path, game)
+        self.since_snapshot = 0
+
+    def _write_snapshot(self, path, game):
+        data = pickle.dumps((self.seq, game), protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
@@ -2,12 +2,30 @@ import random
 import numpy as np
 from http.server import SimpleHTTPRequestHandler, HTTPServer
 from socketserver import ThreadingMixIn
-from urllib.parse import urlparse, parse_qs
+from urllib.parse import urlparse, parse_qs, unquote
 import json
 import html
+import os
+import posixpath
+import re
+import threading
+from collections import OrderedDict
 from html.parser import HTMLParser
+from functools import partial, lru_cache
+from http.cookies import SimpleCookie, CookieError
 
 import dungeon_gen as dgen
+from dungeon_pool import DungeonPool, FloorCache, prepare_dungeon
+from sessions import SessionManager
+from static_cache import StaticCache
+import atlas
+from enemy_store import EnemyStore
+from pathfinding import PathFinder
+import fov
+import metrics
+from spatial import SpatialHash
+from bisect import bisect_left
+from itertools import count
 
 sides =np.array([[ -1, 0], [ 0, 1] , [ 1, 0] , [ 0, -1]] 
              
@@ -15,12 +33,33 @@ sides =np.array([[ -1, 0], [ 0, 1] , [ 1, 0] , [ 0, -1]]
 
 directions = ['n', 'e', 's', 'w'] 
               # N, L, S, O
+facing_codes = {d: i for i, d in enumerate(directions)}
+side_steps = [tuple(side) for side in sides.tolist()]  # sides as (dy, dx) ints
 walkable = [1,2,4,6,7,8] # door, corridor, room
 
 
 json_filename = "./maps/cave.json"  # if found it's used else it's created a new one
 class_number = 1
 n_enemies = 25
+pool_size = 4  # dungeons kept ready for restart
+floor_cache_size = 8  # prepared lower floors kept in memory, older ones are reloaded from the map store
+batched_npcs = False  # move NPCs with the vectorized EnemyStore instead of one Being at a time
+enemy_chase_radius = 8  # NPCs this many steps or closer walk towards the player, 0 = random walk only
+fov_radius = 6  # tiles the player sees, walls and doors block sight (fov.py)
+max_sessions = 500  # players hosted at once, least recently used is evicted
+session_idle_timeout = 30 * 60  # seconds
+SESSION_COOKIE = "dl_session"
+# Journal names are session tokens, so journals/ is never served (is_private_path). None disables journaling
+journal_dir = os.environ.get("DL_JOURNAL_DIR") or os.path.join(dgen.SCRIPT_DIR, "journals")
+snapshot_every = 50  # journaled actions between Game snapshots
+journal_ttl = 7 * 24 * 3600  # seconds the journal of a session no longer in memory is kept for restoring it
+event_keepalive = 15  # seconds between SSE comments on an idle stream
+max_body_size = 64 * 1024  # bytes of a POSTed action, larger bodies are refused unread
+fog_cache_size = 512  # fogged map PNGs kept in memory, a tile is a few KB
+
+# Versions of /api/game_state responses, unique across games so a stale
+# client version can never match a restarted game's stream
+_state_versions = count(1)
 
 
 class SimpleHTMLSanitizer(HTMLParser):
@@ -77,8 +116,17 @@ def sanitize_html(raw_html: str) -> str:
 
 # --- Being Class ---
 class Being:
-    """Represents a character or enemy in the RPG."""
-    def __init__(self, name, class_number, position, is_player=False, n = None ):
+    """
+    Represents a character or enemy in the RPG.
+
+    Slotted, with the position kept as two ints (y, x) and facing as an index
+    into directions; the position/facing properties give the [y, x] list and
+    the letter that get_dict and the rest of the game use.
+    """
+    __slots__ = ('n', 'name', 'cn', 'hp', 'defense', 'attack_power', 'special_power', 'is_player',
+                 'max_hp', 'y', 'x', 'facing_code')
+
+    def __init__(self, name, class_number, position, is_player=False, n = None, rng=random):
         self.n = n
         self.name = name
         self.cn = class_number
@@ -93,53 +141,112 @@ class Being:
             
             if min_hp_calc >= max_hp_calc:
                 max_hp_calc = min_hp_calc * 1.5
-            self.hp = random.randint(int(min_hp_calc), int(max_hp_calc))
+            self.hp = rng.randint(int(min_hp_calc), int(max_hp_calc))
             self.hp = max(1, self.hp)
         except OverflowError:
             print(f"Warning: Overflow encountered generating HP for class {self.cn}. Using fallback.")
             self.hp = 10000 + (self.cn * 1000)
         self.hp = max(1, self.hp)
-        self.defense = max(1, random.randint(int(self.hp / 3.5), int(self.hp / 3.0)) )
-        self.attack_power = max(1, random.randint(int(self.hp / 4.0), int(self.hp / 3.5)) ) 
-        self.special_power = max( self.attack_power+1, random.randint(int(self.hp / 3.0), int(self.hp / 2.0)) ) 
+        self.defense = max(1, rng.randint(int(self.hp / 3.5), int(self.hp / 3.0)) )
+        self.attack_power = max(1, rng.randint(int(self.hp / 4.0), int(self.hp / 3.5)) ) 
+        self.special_power = max( self.attack_power+1, rng.randint(int(self.hp / 3.0), int(self.hp / 2.0)) ) 
 
         self.max_hp = self.hp  # Armazena HP máximo para referência
         self.position = position
-        self.facing = random.choice(directions)
+        self.facing = rng.choice(directions)
+
+    @classmethod
+    def from_stats(cls, name, class_number, position, hp, defense, attack_power, special_power, facing, n=None):
+        """A non-player Being with stats already rolled (see roll_stats)."""
+        being = cls.__new__(cls)
+        being.n = n
+        being.name = name
+        being.cn = class_number
+        being.hp = hp
+        being.defense = defense
+        being.attack_power = attack_power
+        being.special_power = special_power
+        being.is_player = False
+        being.max_hp = hp
+        being.y, being.x = position
+        being.facing_code = facing_codes[facing]
+        return being
+
+    @property
+    def position(self):
+        return [self.y, self.x]
+
+    @position.setter
+    def position(self, value):
+        self.y, self.x = int(value[0]), int(value[1])
+
+    @property
+    def facing(self):
+        return directions[self.facing_code]
+
+    @facing.setter
+    def facing(self, value):
+        self.facing_code = facing_codes[value]
+
+    def __setstate__(self, state):
+        # Slotted pickles are (None, slots); Beings pickled before __slots__ are a
+        # plain dict with 'position'/'facing', which the property setters take
+        if isinstance(state, tuple):
+            state = {**(state[0] or {}), **state[1]}
+        for name, value in state.items():
+            setattr(self, name, value)
         
 
-    def move_being(self, action=None, map=None, enemies=None, player=None):
+    def move_being(self, action=None, map=None, enemies=None, player=None, occupancy=None, walkable_mask=None, rng=random, flow=None):
         """Moves the being. Player uses standard controls: 'n', 'e', 's', 'w'.
-            NPC uses random movement."""
+            NPC uses random movement, or inside a pathfinding.FlowField takes
+            its step towards the player (and waits if that cell is taken).
+            With an occupancy grid (enemy n per cell, -1 if free) and a walkable
+            mask, collision and walkability are single array lookups, and the
+            grid is kept up to date when an NPC moves. Returns True if it moved."""
 
         # PLAYER
         if self.is_player:
             if action in directions:
-                idx = directions.index(action)
-                movement_vector = sides[idx]
-                new_position = self.position + movement_vector
-                self.facing = directions[idx]
-                new_position = ensure_list(new_position)
-
-                if (not any(np.array_equal(new_position, enemy.position) for enemy in enemies)
-                        and int(map[tuple(new_position)]) in walkable) and self.position != new_position:
-                    self.position = new_position
+                idx = facing_codes[action]
+                dy, dx = side_steps[idx]
+                y, x = self.y + dy, self.x + dx
+                self.facing_code = idx
+
+                if occupancy is not None:
+                    free = occupancy[y, x] < 0 and walkable_mask[y, x]
+                else:
+                    free = (not any(enemy.position == [y, x] for enemy in enemies)
+                            and int(map[y, x]) in walkable)
+                if free:
+                    self.y, self.x = y, x
                     return True
             
 
 
         # NPC
         else:
-            random_index = random.randint(0, 3)
-            movement_vector = sides[random_index]
-            new_position = self.position + movement_vector
-            new_position = ensure_list(new_position)
+            random_index = -1 if flow is None else flow.direction(self.y, self.x)
+            if random_index < 0:
+                random_index = rng.randint(0, 3)
+            dy, dx = side_steps[random_index]
+            y, x = self.y + dy, self.x + dx
             
-            if (not any(np.array_equal(new_position, enemy.position) for enemy in enemies)
-                    and not np.array_equal(new_position, player.position)
-                    and int(map[tuple(new_position)]) in walkable) and self.position != new_position:
-                self.position = new_position
-                self.facing = directions[random_index] 
+            if occupancy is not None:
+                free = (occupancy[y, x] < 0
+                        and (y != player.y or x != player.x)
+                        and walkable_mask[y, x])
+            else:
+                free = (not any(enemy.position == [y, x] for enemy in enemies)
+                        and (y != player.y or x != player.x)
+                        and int(map[y, x]) in walkable)
+            if free:
+                if occupancy is not None:
+                    occupancy[self.y, self.x] = -1
+                    occupancy[y, x] = self.n
+                self.y, self.x = y, x
+                self.facing_code = random_index
+                return True
         return False
      
     def get_dict(self, map=None):
@@ -279,24 +386,69 @@ ENEMY_TYPES = {
 }
 
 
-def create_enemies(map, class_number, n_enemies):
-    possible_positions = np.argwhere(map == 8)
+@lru_cache(maxsize=None)
+def class_hp_bounds(class_number):
+    """
+    (min, max) HP of a class, as Being.__init__ draws it, or None when the
+    bounds do not fit in int64 and only the per-Being path can handle them.
+    """
+    try:
+        min_hp_calc = 8 * (10**(class_number - 1))
+        max_hp_calc = 8 * (15**(class_number - 1))
+        if min_hp_calc >= max_hp_calc:
+            max_hp_calc = min_hp_calc * 1.5
+        low, high = int(min_hp_calc), int(max_hp_calc)
+    except OverflowError:
+        return None
+    if high >= np.iinfo(np.int64).max:
+        return None
+    return low, high
+
+
+def roll_stats(class_number, n, np_rng=np.random):
+    """
+    Draws hp, defense, attack and special for n beings of a class at once,
+    with the same distributions as Being.__init__. Returns a dict of int64
+    arrays, or None if the class is too strong for int64.
+    """
+    bounds = class_hp_bounds(class_number)
+    if bounds is None:
+        return None
+    low, high = bounds
+    hp = np.maximum(1, np_rng.randint(low, high + 1, size=n, dtype=np.int64))
+    # int(hp / k) in Being is a truncating float division, like astype here
+    defense = np.maximum(1, np_rng.randint((hp / 3.5).astype(np.int64), (hp / 3.0).astype(np.int64) + 1))
+    attack = np.maximum(1, np_rng.randint((hp / 4.0).astype(np.int64), (hp / 3.5).astype(np.int64) + 1))
+    special = np.maximum(attack + 1, np_rng.randint((hp / 3.0).astype(np.int64), (hp / 2.0).astype(np.int64) + 1))
+    return {"hp": hp, "defense": defense, "attack_power": attack, "special_power": special}
+
+
+def create_enemies(map, class_number, n_enemies, possible_positions=None, rng=random, np_rng=np.random):
+    if possible_positions is None:
+        possible_positions = np.argwhere(map == 8)
     len_pos = len(possible_positions)
 
     if len_pos >= n_enemies:
-        random_indices = np.random.choice(len_pos, size=n_enemies, replace=False)
+        random_indices = np_rng.choice(len_pos, size=n_enemies, replace=False)
         choices = ensure_list(possible_positions[random_indices])
     else:
         print(f"An error occurred, possible_positions returned only {len_pos}.")
         return
     
-    enemies = []
-    for i in range(n_enemies):
-        possible_names = ENEMY_TYPES.get(class_number, [f"Anomaly Class {class_number}"])
-        name = random.choice(possible_names)
-        enemies.append(Being(name, class_number, choices[i], n=i))
-    
-    return enemies
+    possible_names = ENEMY_TYPES.get(class_number, [f"Anomaly Class {class_number}"])
+    stats = roll_stats(class_number, n_enemies, np_rng)
+    if stats is None:
+        # Out of int64 range: roll one Being at a time
+        return [Being(rng.choice(possible_names), class_number, choices[i], n=i, rng=rng) for i in range(n_enemies)]
+
+    # Batch path: every stat, name and facing drawn in one numpy call each
+    names = np_rng.randint(len(possible_names), size=n_enemies).tolist()
+    facings = np_rng.randint(len(directions), size=n_enemies).tolist()
+    columns = zip(stats["hp"].tolist(), stats["defense"].tolist(),
+                  stats["attack_power"].tolist(), stats["special_power"].tolist())
+    return [Being.from_stats(possible_names[names[i]], class_number, choices[i], hp, defense, attack, special,
+                             directions[facings[i]], n=i)
+            for i, (hp, defense, attack, special) in enumerate(columns)]
 
 
 
@@ -341,13 +493,34 @@ def search_dict(lis, dic):
 def ensure_list(obj):
     return obj.tolist() if isinstance(obj, np.ndarray) else obj
 
+
+def floor_class(class_number, depth):
+    # One class stronger per floor, up to the strongest in ENEMY_TYPES
+    return min(class_number + depth - 1, max(ENEMY_TYPES))
+
+
+def make_pathfinder(walkable_mask):
+    # None when enemies only random-walk
+    return PathFinder(walkable_mask, enemy_chase_radius) if enemy_chase_radius > 0 else None
+
 # --- Classe que controla o estado do jogo ---
 class Game:
-    def __init__(self):
-        self.map = dgen.load_dungeon(json_filename, np.random.randint(35, 101), np.random.randint(35, 101), np.random.randint(16777216), return_values = True)
-        self.map_path = self.map[1]
-        self.map = self.map[0]
-        self.traps = np.argwhere(self.map == 4)
+    def __init__(self, dungeon=None, render=True):
+        # render=False: headless, the map is not rendered or saved (see simulate.py)
+        if dungeon is None:
+            dungeon = prepare_dungeon(json_filename, render=render)
+        self.render = render
+        self.depth = 1  # floor number, see descend()
+        self.load_floor(dungeon)
+        # Private generators, reseeded per journaled action so runs can be replayed
+        self.rng = random.Random()
+        self.np_rng = np.random.RandomState()
+        self.enemy_store = None
+        self.enemy_index = SpatialHash()
+        self.enemy_by_n = {}
+        self.enemy_dicts = {}  # n -> (state key, get_dict() result) reused while unchanged
+        self.stream = None  # delta baseline of the last state sent, see state_delta
+        self.epoch = next(_state_versions)  # changes on restart/new game/new floor, baselines from before are stale
         self.log = []
         self.player = None
         self.enemies = None
@@ -355,19 +528,113 @@ class Game:
         self.dict_enemies = None
         self.game_over = False
 
+    def load_floor(self, dungeon):
+        """Takes the map of a PreparedDungeon and the indexes built from it; nothing is explored yet."""
+        self.map = dungeon.map
+        self.map_id = dungeon.map_id
+        self.traps = dungeon.traps
+        self.start_position = dungeon.start_position
+        self.room_cells = dungeon.room_cells
+        self.walkable_mask = np.isin(self.map, walkable)
+        self.opaque_mask = fov.opaque_mask(self.map)
+        self.pathfinder = make_pathfinder(self.walkable_mask)
+        self.explored = np.zeros(self.map.shape, dtype=bool)  # tiles the player has seen
+        self.seen_from = []  # player tiles whose view explored something new, see state_delta
+        self.occupancy = np.full(self.map.shape, -1, dtype=np.int32)  # enemy n per cell, -1 if free
+
+    # Tile data is not pickled: snapshots store the map id and reload it from the map store
+    _MAP_ATTRS = ('map', 'walkable_mask', 'opaque_mask', 'room_cells', 'pathfinder')
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for attr in self._MAP_ATTRS:
+            state.pop(attr, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.map = dgen.load_stored_map(self.map_id)
+        self.walkable_mask = np.isin(self.map, walkable)
+        self.opaque_mask = fov.opaque_mask(self.map)
+        self.room_cells = np.argwhere(self.map == dgen.ROOM)
+        self.pathfinder = make_pathfinder(self.walkable_mask)
+        if "explored" not in state:  # snapshot from before fog of war
+            self.explored = np.zeros(self.map.shape, dtype=bool)
+            self.seen_from = []
+        if "depth" not in state:  # snapshot from before multi-floor runs
+            self.depth = 1
+            self.render = True
+
+    def reseed(self, seed):
+        self.rng.seed(seed)
+        self.np_rng.seed(seed)
+
     def new_game(self, player_name, class_number):
         self.log = []
-        start_position = np.argwhere(self.map == 6)
-        start_position = ensure_list(start_position[0])
+        start_position = list(self.start_position)
         
-        self.player = Being(player_name if sanitize_html(player_name.strip()) else "Hero", class_number, start_position, is_player=True)
-        self.enemies = create_enemies(self.map, class_number, n_enemies)
-        self.dict_enemies = [i.get_dict(map=self.map)["n"] for i in self.enemies]
+        self.player = Being(player_name if sanitize_html(player_name.strip()) else "Hero", class_number, start_position, is_player=True, rng=self.rng)
+        self.spawn_enemies(floor_class(class_number, self.depth))
+        self.explored.fill(False)
+        self.seen_from = []
+        self.stream = None
+        self.epoch = next(_state_versions)
         self.game_over = False
         self.log.append(f"\nWelcome, {self.player.name}!\n")
+        self.prefetch_next_floor()
+
+    def spawn_enemies(self, class_number):
+        self.enemies = create_enemies(self.map, class_number, n_enemies, self.room_cells, self.rng, self.np_rng)
+        self.occupancy.fill(-1)
+        for enemy in self.enemies:
+            self.occupancy[enemy.position[0], enemy.position[1]] = enemy.n
+        self.enemy_store = None
+        if batched_npcs:
+            self.enemy_store = EnemyStore(self.enemies)
+            self.enemies = self.enemy_store.views()
+        self.enemy_index = SpatialHash()
+        for enemy in self.enemies:
+            self.enemy_index.insert(enemy.n, enemy.position)
+        self.enemy_by_n = {enemy.n: enemy for enemy in self.enemies}
+        self.enemy_dicts = {}
+        self.dict_enemies = [i.get_dict(map=self.map)["n"] for i in self.enemies]
+        self.current_enemy = None
 
-
-    def process_player_action(self, action):
+    def next_floor(self):
+        """floor_cache.get() arguments of the floor below this one."""
+        return self.map_id, self.depth + 1, self.render
+
+    def takes_stairs(self, action):
+        """True if process_player_action(action) would descend."""
+        if self.player is None or self.game_over or self.current_enemy is not None or action not in facing_codes:
+            return False
+        dy, dx = side_steps[facing_codes[action]]
+        return self.map[self.player.y + dy, self.player.x + dx] == dgen.STAIR_DOWN
+
+    def descend(self, floor=None):
+        """
+        Takes the stairs down: in served games the next floor was prefetched
+        when this one started, so this is a swap. Its enemies are one class
+        stronger. floor is that floor if the caller already got it from
+        floor_cache.
+        """
+        self.load_floor(floor if floor is not None else floor_cache.get(*self.next_floor()))
+        self.depth += 1
+        self.player.position = list(self.start_position)
+        self.spawn_enemies(floor_class(self.player.cn, self.depth))
+        self.stream = None
+        self.epoch = next(_state_versions)
+        self.log.append(f"\n{self.player.name} takes the stairs down to floor {self.depth}.\n")
+        self.prefetch_next_floor()
+
+    def prefetch_next_floor(self):
+        # Headless games (simulate.py) skip it: they run by the thousand and
+        # most never reach the stairs, so descend builds their floor inline
+        if self.render:
+            floor_cache.prefetch(*self.next_floor())
+
+
+    def process_player_action(self, action, floor=None):
         if self.game_over:
             self.log.append("\nGame over. Restart to play again.")
             return
@@ -376,11 +643,14 @@ class Game:
         bool_enemy = self.current_enemy is None
         
         if action in directions and bool_enemy:
-            valid_mov = self.player.move_being(action, self.map, self.enemies)
+            if self.takes_stairs(action):
+                self.descend(floor)
+                return
+            valid_mov = self.player.move_being(action, self.map, self.enemies, occupancy=self.occupancy, walkable_mask=self.walkable_mask)
             if valid_mov:
                 mask = np.all(self.traps == self.player.position, axis=1)
                 if np.any(mask):
-                    roll = random.randint(1, 100)
+                    roll = self.rng.randint(1, 100)
                     dmg  = self.player.take_damage(int((1.0-(roll/100))*3) )
                     self.log.append(
                         f"{self.player.name} opens a door with a trap! (Roll: {roll}) and "
@@ -388,12 +658,20 @@ class Game:
                     )
                     self.traps = self.traps[~mask]
                     self.verify_game_over("Trap Door")
-                for i in range(len(self.enemies)):
-                    self.enemies[i].move_being(map=self.map, enemies=self.enemies, player=self.player)
+                # One distance field from the player serves every chasing NPC
+                flow = self.pathfinder.field(self.player.position) if self.pathfinder is not None else None
+                if self.enemy_store is not None:
+                    movers = self.enemy_store.step(self.walkable_mask, self.occupancy, self.player.position, self.np_rng, flow)
+                    for n in movers.tolist():
+                        self.enemy_index.move(n, self.enemy_store.position[n])
+                else:
+                    for enemy in self.enemies:
+                        if enemy.move_being(map=self.map, player=self.player, occupancy=self.occupancy, walkable_mask=self.walkable_mask, rng=self.rng, flow=flow):
+                            self.enemy_index.move(enemy.n, (enemy.y, enemy.x))
             
         elif action in ['a', 'sp'] and not bool_enemy:
             use_special = (action == 'sp')
-            roll = random.randint(1, 100)
+            roll = self.rng.randint(1, 100)
             enemy = self.enemies[self.current_enemy]
             damage = calculate_damage(self.player, enemy, roll, use_special)
             dmg = self.enemies[self.current_enemy].take_damage(damage)
@@ -402,6 +680,12 @@ class Game:
             self.log.append(f"{self.player.name} {act} {enemy.name}! (Roll: {roll}) dealt {dmg} damage.")
             if not self.enemies[self.current_enemy].is_alive():
                 self.log.append(f"\n*** Victory! {self.enemies[self.current_enemy].name} was defeated. ***")
+                self.occupancy[enemy.position[0], enemy.position[1]] = -1
+                if self.enemy_store is not None:
+                    self.enemy_store.kill(enemy.n)
+                self.enemy_index.remove(enemy.n)
+                self.enemy_by_n.pop(enemy.n, None)
+                self.enemy_dicts.pop(enemy.n, None)
                 self.enemies.pop(self.current_enemy)
                 self.dict_enemies.pop(self.current_enemy)
                 self.current_enemy = None
@@ -412,11 +696,12 @@ class Game:
             else:
                 self.enemy_turn(enemy)
         elif action == 't' and not bool_enemy: 
-            roll = random.randint(1, 100)
-            rand_direction = random.randint(0, 3)
+            roll = self.rng.randint(1, 100)
+            rand_direction = self.rng.randint(0, 3)
             act = "failed"
             if roll > 30:
-                valid_escape = self.player.move_being(directions[rand_direction], self.map, self.enemies)
+                valid_escape = self.player.move_being(directions[rand_direction], self.map, self.enemies,
+                                                      occupancy=self.occupancy, walkable_mask=self.walkable_mask)
                 act = "succeeded" if valid_escape else act
             if act == "failed":
                 self.log.append(f"{self.player.name} tried to escape... and {act}! Received an attack of opportunity!")
@@ -436,45 +721,407 @@ class Game:
             self.game_over = True
             
     def enemy_turn(self, enemy):
-        roll = random.randint(1, 100)
+        roll = self.rng.randint(1, 100)
         damage = calculate_damage(enemy, self.player, roll, use_special=False)
         dmg = self.player.take_damage(damage)
         self.log.append(f"{enemy.name} attacks {self.player.name}! (Roll: {roll}) dealt {dmg} damage.")
         self.verify_game_over(enemy.name)
 
 
+    def view(self, position=None):
+        """(visible window, origin) seen from position, the player's by default."""
+        position = self.player.position if position is None else position
+        return fov.field_of_view(self.map_id, self.opaque_mask, position, fov_radius)
+
+    def fog_version(self):
+        """Changes whenever more of the map is explored (or another floor or game is loaded)."""
+        return f"{self.epoch}.{len(self.seen_from)}"
+
+    def update_view(self):
+        """The player's view (see view()), marked as explored."""
+        view = self.view()
+        visible, (y0, x0) = view
+        explored = self.explored[y0:y0 + visible.shape[0], x0:x0 + visible.shape[1]]
+        if (visible & ~explored).any():
+            explored |= visible
+            self.seen_from.append(tuple(self.player.position))
+        return view
+
+    def update_current_enemy(self):
+        """
+        Sets self.current_enemy to the first enemy within reach of the player,
+        or None. Returns the n of the enemies in view (in the field of view,
+        plus those in reach even around a corner) and of those in reach.
+        """
+        self.current_enemy = None
+        if self.enemies is None or self.player is None:
+            return [], []
+        visible, (y0, x0) = self.update_view()
+        h, w = visible.shape
+        nearby = []
+        for n in self.enemy_index.query(self.player.position, fov_radius):
+            y, x = self.enemy_by_n[n].position
+            if 0 <= y - y0 < h and 0 <= x - x0 < w and visible[y - y0, x - x0]:
+                nearby.append(n)
+        reachable = self.enemy_index.query(self.player.position, 1.49)
+        if reachable:
+            nearby = sorted(set(nearby).union(reachable))
+            # n order, like self.enemies/self.dict_enemies
+            self.current_enemy = bisect_left(self.dict_enemies, reachable[0])
+        return nearby, reachable
+
+    def enemy_dict(self, n):
+        """get_dict() of enemy n, reused as long as its hp, facing and position are unchanged."""
+        enemy = self.enemy_by_n[n]
+        key = (enemy.hp, enemy.facing, tuple(enemy.position))
+        cached = self.enemy_dicts.get(n)
+        if cached is None or cached[0] != key:
+            cached = (key, enemy.get_dict(map=self.map))
+            self.enemy_dicts[n] = cached
+        return cached[1]
+
     # --- NEW METHOD TO GET STATE AS DICT ---
-    def get_state_dict(self):
+    def get_state_update(self, since=None):
+        """
+        Returns the state as a delta against the version the client last
+        applied: only new log lines and enemies that were added, changed or
+        removed. A full snapshot (full=True) is sent when `since` is missing
+        or is not the last version this game handed out.
+        """
+        baseline = self.stream if self.stream is not None and since == self.stream[0] else None
+        state, self.stream = self.state_delta(baseline)
+        return state
+
+    def state_delta(self, baseline=None):
+        """
+        Returns (state, new baseline). baseline is what a previous call
+        returned, (version, enemy dicts by n, log length, epoch, views
+        explored); without one, or when the game was restarted since, the
+        state is a full snapshot. Event streams keep their own baseline,
+        polling uses self.stream.
+        """
+        version = next(_state_versions)
+        full = baseline is None or baseline[3] != self.epoch
+        state = self.get_state_dict(include_log=full, include_explored=full)
+        current = {e["n"]: e for e in state["enemies"] or ()}
+
+        if full:
+            state.update(full=True, version=version, log_start=0)
+        else:
+            _, sent, log_len, _, seen = baseline
+            if state["fog"] is not None:
+                # Every view that explored something since, not only the last:
+                # several actions can land between two deltas
+                state["fog"]["explored_views"] = [fov.encode_view(self.view(p)) for p in self.seen_from[seen:]]
+            state = {
+                "full": False,
+                "version": version,
+                "needs_setup": state["needs_setup"],
+                "player": state["player"],
+                "enemy": state["enemy"],
+                # Unchanged enemies keep the same cached dict, so identity is the fast path
+                "enemies_changed": [e for n, e in current.items() if sent.get(n) is not e and sent.get(n) != e],
+                "enemies_removed": [n for n in sent if n not in current],
+                "log": self.log[log_len:],
+                "log_start": log_len,
+                "map_path": state["map_path"],
+                "fog": state["fog"],
+                "game_over": state["game_over"],
+            }
+        return state, (version, current, len(self.log), self.epoch, len(self.seen_from))
+
+    def get_state_dict(self, include_log=True, include_explored=True):
         """Returns the current game state as a dictionary suitable for JSON."""
-        enemies, current_enemy, self.current_enemy = None, None, None
+        enemies, current_enemy = None, None
         player_is_none = self.player is None
         
-        if self.enemies is not None and not player_is_none:
-            enemies = get_nearby_enemies(self.enemies, self.player, self.map)
-            if enemies is not None:
-                reachable_enemies = get_nearby_enemies(enemies, self.player, self.map, 1.49, True)
-                if reachable_enemies is not None:
-                    current_enemy = search_dict(enemies, reachable_enemies)
-                    self.current_enemy = search_dict(self.dict_enemies, reachable_enemies["n"]) if self.dict_enemies and reachable_enemies.get("n", False) else None
+        nearby, reachable = self.update_current_enemy()
+        if nearby:
+            enemies = [self.enemy_dict(n) for n in nearby]
+            if reachable:
+                # Both lists are in n order
+                current_enemy = nearby.index(reachable[0])
+
+        # Fog of war: what the player sees now, and on full snapshots every tile seen so far
+        fog = None
+        if not player_is_none:
+            fog = {"radius": fov_radius, "visible": fov.encode_view(self.view()), "version": self.fog_version()}
+            if include_explored:
+                fog["explored"] = fov.encode_bits(self.explored)
+        # The map is only served masked to what was explored (fogged_map), its URLs change with it
+        map_path = f"{MAP_ROUTE}?v={self.fog_version()}" if self.render else None
         
         return {
             "needs_setup": player_is_none,
             "player": self.player.get_dict(map=self.map) if not player_is_none else None,
             "enemy": current_enemy,
             "enemies": enemies,
-            "log": self.log[:],  # Send a copy of the recent log
-            "map_path": self.map_path,
+            "log": self.log[:] if include_log else None,  # Send a copy of the recent log
+            "map_path": map_path,
+            "map_id": self.map_id,
             "map_shape" : self.map.shape,
+            "tiles": {"size": dgen.TILE_SIZE, "cell_sizes": dgen.TILE_CELL_SIZES, "palette": dgen.PALETTE_VERSION},
+            "fog": fog,
+            "floor": self.depth,
             "game_over": self.game_over,
         }
 
-game = Game()
+# Started by run_server (or the first get()), so importing main, as simulate.py
+# workers do, does not render maps in the background
+dungeon_pool = DungeonPool(partial(prepare_dungeon, json_filename), size=pool_size, start=False)
+floor_cache = FloorCache(floor_cache_size)
+
+
+def play_event(game, event, dungeon=None):
+    """
+    Applies a journaled action to game. Random draws come from the game's own
+    generators seeded with event["s"], so replaying an event reproduces it.
+    """
+    game.reseed(event["s"])
+    action = event["a"]
+    if action == "start":
+        game.new_game(event["name"], event["class"])
+    elif action == "restart":
+        # Live restarts take a ready dungeon from the pool, replays reload it from the map store
+        game.__init__(dungeon or prepare_dungeon(dgen.map_store_path(event["map"]), render=game.render),
+                      render=game.render)
+    else:
+        game.process_player_action(action, dungeon)
+    # Combat targets are picked when the state is read; do it here too so
+    # replays see the same target without building a state
+    game.update_current_enemy()
+
+
+def apply_action(game, action, qs, journal=None, dungeon=None):
+    """
+    Applies an action to game, returns True if it was accepted (and journaled).
+    A restart uses `dungeon` if given, else takes one from the pool; a move
+    onto the stairs uses it as the next floor, else gets it from floor_cache.
+    """
+    event = None
+    if action == "start":
+        name = qs.get("name", ["Hero"])[0]
+        try:
+            class_number = int(qs.get("class", ["1"])[0])
+            if not (1 <= class_number <= 8):
+                class_number = 1
+        except ValueError:
+            class_number = 1
+        event = {"a": "start", "name": name, "class": class_number}
+    elif action == "restart":
+        dungeon = dungeon or dungeon_pool.get() # Re-initialize game with a ready dungeon
+        event = {"a": "restart", "map": dungeon.map_id}
+    elif action in ['a', 'sp', 't', 'n', 'e', 's', 'w']:
+        if game.player is not None: # Only process if game started
+            event = {"a": action}
+    # Action 'get_state' or any other/no action just returns current state
+
+    if event is None:
+        return False
+    event["s"] = random.getrandbits(32)
+    if journal is not None:
+        journal.start(game)  # the session's first accepted action writes its base snapshot
+    with metrics.PHASES.time("action", action):
+        play_event(game, event, dungeon)
+        if journal is not None:
+            journal.record(event, game)
+    metrics.ACTIONS.inc((action,))
+    return True
+
+
+def action_label(qs):
+    """The request's action as a metrics label, 'get_state' for plain state reads."""
+    action = qs.get("action", [None])[0]
+    return action if action in ACTIONS else "get_state"
+
+
+def state_json(game, qs):
+    """The state as JSON, a delta if the client sent the version it has (?since=)."""
+    try:
+        since = int(qs.get("since", [""])[0])
+    except ValueError:
+        since = None
+    label = action_label(qs)
+    with metrics.PHASES.time("state", label):
+        state = game.get_state_update(since)
+    with metrics.PHASES.time("encode", label):
+        return json.dumps(state) # Convert dict to JSON string
+
+
+def apply_game_action(game, action, qs, journal=None):
+    """Applies an /api/game_state action to game and returns the state as JSON."""
+    # Process actions BEFORE getting state
+    apply_action(game, action, qs, journal)
+    return state_json(game, qs)
+
+
+sessions = SessionManager(lambda: Game(dungeon_pool.get()), max_sessions, session_idle_timeout,
+                          journal_dir, snapshot_every, play_event, journal_ttl)
+
+# --- Metrics (/api/metrics), how many phases are timed is metrics.sample_rate ---
+metrics.Gauge("dl_sessions", "Sessions in memory.", lambda: len(sessions))
+metrics.Gauge("dl_enemies", "Enemies alive on the floors of every session.",
+              lambda: sum(len(session.game.enemies or ()) for session in sessions.live()))
+metrics.Gauge("dl_log_lines", "Log lines kept by every session's game.",
+              lambda: sum(len(session.game.log) for session in sessions.live()))
+
+
+# /tiles/<map_id>/<z>/<tx>/<ty>.png, and the overview: both only show what the session's player explored
+TILE_ROUTE = re.compile(r"^/tiles/([0-9a-f]{32})/(\d+)/(\d+)/(\d+)\.png$")
+MAP_ROUTE = '/api/map.png'
+# Atlas PNGs are named after the md5 of their pixels, so a URL never changes content
+IMMUTABLE_ROUTE = re.compile(r"^/maps/atlas/[0-9a-f]{32}\.png$")
+ATLAS_ROUTE = '/atlas.json'
+# Top-level directories never served as static files, the default journal_dir among them.
+# Of maps/ only the sprite atlas is public: the rest (overviews, tiles, the map store) shows whole maps
+PRIVATE_DIRS = ("journals", "maps")
+PUBLIC_SUBDIRS = {"maps": "atlas"}
+METRICS_ROUTE = '/api/metrics'
+
+static_files = StaticCache()
+
+def sprite_manifest():
+    """Path of the sprite atlas manifest, rebuilt first if a sprite changed."""
+    return atlas.ensure_atlas([name for names in ENEMY_TYPES.values() for name in names])
+
+def is_private_path(url_path):
+    parts = [p for p in posixpath.normpath(unquote(url_path)).split("/") if p and p not in (os.curdir, os.pardir)]
+    if not parts or parts[0] not in PRIVATE_DIRS:
+        return False
+    return len(parts) < 2 or PUBLIC_SUBDIRS.get(parts[0]) != parts[1]
+
+def session_token(qs, cookie_header):
+    """A request's session token: its cookie, else ?session=."""
+    token = qs.get("session", [None])[0]
+    try:
+        cookie = SimpleCookie(cookie_header or "")
+        if SESSION_COOKIE in cookie:
+            token = cookie[SESSION_COOKIE].value
+    except CookieError:
+        pass
+    return token
+
+_fog_cache = OrderedDict()  # (map_id, z, tx, ty, what is explored) -> PNG
+_fog_cache_lock = threading.Lock()
+
+
+def fogged_map(session, map_id=None, z=None, tx=0, ty=0):
+    """
+    (status, headers, body) of a PNG of the session's map in which every
+    tile its player has not explored is drawn as unexplored rock: the
+    overview, or tile (tx, ty) at zoom level z of map_id. Raises ValueError
+    for another map than the session's or a tile outside it.
+
+    Only the cells under a tile are copied under the session lock; the fog is
+    drawn over the tile's cached render (dgen.get_tile) and the PNG is cached
+    by the explored cells it shows, so revisits and other players' identical
+    views cost a lookup. The overview changes with every step into the
+    unknown, so it is one pixel per cell, scaled up by the client.
+    """
+    with session.lock:
+        game = session.game
+        if map_id is not None and map_id != game.map_id:
+            raise ValueError(f"Map '{map_id}' is not this session's map.")
+        map_id = game.map_id
+        if z is None:
+            key = (map_id, None, game.fog_version())
+            values, explored = game.map, game.explored.copy()
+        else:
+            if not 0 <= z < len(dgen.TILE_CELL_SIZES):
+                raise ValueError(f"Invalid zoom level {z}.")
+            cy0, cy1, cx0, cx1 = dgen.tile_cells(game.map.shape, z, tx, ty)
+            explored = game.explored[cy0:cy1, cx0:cx1].copy()
+            key = (map_id, z, tx, ty, explored.shape, np.packbits(explored, axis=None).tobytes())
+
+    with _fog_cache_lock:
+        body = _fog_cache.get(key)
+        if body is not None:
+            _fog_cache.move_to_end(key)
+    if body is None:
+        with metrics.MAP_PHASES.time("fog"):
+            if z is None:
+                # game.map is never written, only replaced by descend, so it is read outside the lock
+                body = dgen.encode_png(dgen.map_pixels(np.where(explored, values, dgen.EMPTY)))
+            elif explored.all():
+                with open(dgen.get_tile(map_id, z, tx, ty), "rb") as f:
+                    body = f.read()
+            else:
+                body = dgen.encode_png(dgen.fog_tile(dgen.load_tile(map_id, z, tx, ty), explored, z, tx, ty))
+        with _fog_cache_lock:
+            _fog_cache[key] = body
+            if len(_fog_cache) > fog_cache_size:
+                _fog_cache.popitem(last=False)
+    # URLs carry the fog version (see Game.get_state_dict), so a cached copy is only revalidated
+    headers = [("Cache-Control", "private, no-cache"), ("Content-type", "image/png"),
+               ("Content-Length", str(len(body)))]
+    return 200, headers, body
+
+ACTIONS = ('start', 'restart', 'a', 'sp', 't', 'n', 'e', 's', 'w')
 
 class RPGRequestHandler(SimpleHTTPRequestHandler):
+    # Keep-alive: every response below sends a Content-Length (the event stream closes instead)
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this each keep-alive
+    # response waits on the client's delayed ACK
+    disable_nagle_algorithm = True
 
     def log_message(self, format, *args):
         pass
 
+    def send_cached(self, path, immutable=False):
+        """Serves a file through static_files (ETag/304, gzip, Cache-Control)."""
+        result = static_files.respond(path, self.headers.get("If-None-Match"),
+                                      self.headers.get("Accept-Encoding", ""), immutable)
+        if result is None:
+            self.send_error(404, "File not found")
+            return
+        self.send_result(result)
+
+    def send_result(self, result):
+        code, headers, body = result
+        self.send_response(code)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, code, body):
+        data = body.encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-type", "application/json; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache") # Important for APIs
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_fogged_map(self, qs, *tile):
+        """The session's overview, or a tile with map_id, z, tx, ty, see fogged_map."""
+        session = sessions.get(session_token(qs, self.headers.get("Cookie")))
+        if session is None:
+            self.send_error(404, "No session")
+            return
+        try:
+            result = fogged_map(session, *tile)
+        except ValueError as e:
+            self.send_error(404, str(e))
+            return
+        except Exception as e:
+            self.send_error(500, f"Error rendering the map: {e}")
+            return
+        self.send_result(result)
+
+    def get_session(self, qs):
+        """Session from the cookie (or a ?session= token), created if unknown or evicted."""
+        session, created = sessions.get_or_create(session_token(qs, self.headers.get("Cookie")))
+        self.new_session_token = session.token if created else None
+        return session
+
+    def end_headers(self):
+        if getattr(self, "new_session_token", None):
+            self.send_header("Set-Cookie", f"{SESSION_COOKIE}={self.new_session_token}; Path=/; HttpOnly; SameSite=Lax")
+            self.new_session_token = None
+        super().end_headers()
+
     def do_GET(self):
         parsed = urlparse(self.path)
         qs = parse_qs(parsed.query)
@@ -483,63 +1130,143 @@ class RPGRequestHandler(SimpleHTTPRequestHandler):
         # --- API Endpoint: /api/game_state ---
         if parsed.path == '/api/game_state':
             try:
-                # Process actions BEFORE getting state
-                if action == "start":
-                    name = qs.get("name", ["Hero"])[0]
-                    try:
-                        class_number = int(qs.get("class", ["1"])[0])
-                        if not (1 <= class_number <= 8):
-                            class_number = 1
-                    except ValueError:
-                        class_number = 1
-                    game.new_game(name, class_number)
-                elif action == "restart":
-                    game.__init__() # Re-initialize game
-                elif action in ['a', 'sp', 't', 'n', 'e', 's', 'w']:
-                    if game.player is not None: # Only process if game started
-                        game.process_player_action(action)
-                # Action 'get_state' or any other/no action just returns current state
-
-                # Get current state AFTER processing action
-                state_dict = game.get_state_dict()
-                json_response = json.dumps(state_dict) # Convert dict to JSON string
+                session = self.get_session(qs)
+                with session.lock:
+                    if apply_action(session.game, action, qs, session.journal):
+                        session.notify()
+                    json_response = state_json(session.game, qs)
 
                 # Send JSON response
-                self.send_response(200)
-                self.send_header("Content-type", "application/json; charset=utf-8")
-                self.send_header("Cache-Control", "no-cache") # Important for APIs
-                self.end_headers()
-                self.wfile.write(json_response.encode("utf-8"))
+                with metrics.PHASES.time("write", action_label(qs)):
+                    self.send_json(200, json_response)
 
             except Exception as e:
                  # Send error as JSON if possible
-                 self.send_response(500) # Internal Server Error
-                 self.send_header("Content-type", "application/json; charset=utf-8")
-                 self.send_header("Cache-Control", "no-cache")
-                 self.end_headers()
+                 metrics.ERRORS.inc((parsed.path,))
                  error_json = json.dumps({"error": f"Server error: {e.__class__.__name__}", "details": str(e)})
-                 self.wfile.write(error_json.encode("utf-8"))
+                 self.send_json(500, error_json) # Internal Server Error
                  print(f"Error processing API request: {e}") # Log server-side
 
+        # --- Server-Sent Events: state deltas pushed after every action ---
+        elif parsed.path == '/api/events':
+            self.stream_events(self.get_session(qs))
+
+        # --- Metrics in the Prometheus text format ---
+        elif parsed.path == METRICS_ROUTE:
+            data = metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-type", metrics.CONTENT_TYPE)
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
         # --- Serve index.html for the root path ---
         elif parsed.path == '/':
+            # Served from memory, re-read only when the file changes
+            self.send_cached("index.html")
+
+        # --- Sprite atlas manifest: one image with every character and enemy ---
+        elif parsed.path == ATLAS_ROUTE:
             try:
-                # Serve index.html directly
-                with open("index.html", "rb") as f: # Read as binary
-                    self.send_response(200)
-                    self.send_header("Content-type", "text/html; charset=utf-8")
-                    self.end_headers()
-                    self.wfile.write(f.read())
-            except FileNotFoundError:
-                 self.send_error(404, "File Not Found: index.html")
+                manifest_path = sprite_manifest()
             except Exception as e:
-                 self.send_error(500, f"Error reading index.html: {e}")
+                self.send_error(500, f"Error building the sprite atlas: {e}")
+                return
+            self.send_cached(manifest_path)
+
+        # --- The session's map: overview and tiles, only where the player has been ---
+        elif parsed.path == MAP_ROUTE:
+            self.send_fogged_map(qs)
+
+        elif TILE_ROUTE.match(parsed.path):
+            map_id, z, tx, ty = TILE_ROUTE.match(parsed.path).groups()
+            self.send_fogged_map(qs, map_id, int(z), int(tx), int(ty))
+
+        elif is_private_path(parsed.path):
+            self.send_error(404, "File not found")
 
         # --- Serve other static files (like map.png) ---
         else:
-            # Use the parent class's handler for static files
-            # It looks for files relative to where the server is running
-            super().do_GET()
+            # Files come from the cache, relative to where the server is running;
+            # directories (listings, redirects) still go to the parent class
+            path = self.translate_path(self.path)
+            if os.path.isdir(path):
+                super().do_GET()
+            else:
+                self.send_cached(path, bool(IMMUTABLE_ROUTE.match(parsed.path)))
+
+    def do_POST(self):
+        parsed = urlparse(self.path)
+        if parsed.path != '/api/action':
+            self.send_error(404, "Not Found")
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.send_error(400, "Bad Content-Length")
+            return
+        if length > max_body_size:
+            self.send_error(413, "Request body too large")
+            return
+        form = parse_qs(self.rfile.read(length).decode("utf-8", "replace"))
+        qs = {**parse_qs(parsed.query), **form}
+        action = qs.get("action", [None])[0]
+        if action not in ACTIONS:
+            self.send_error(400, f"Unknown action: {action}")
+            return
+        try:
+            session = self.get_session(qs)
+            with session.lock:
+                if apply_action(session.game, action, qs, session.journal):
+                    session.notify()
+        except Exception as e:
+            metrics.ERRORS.inc((parsed.path,))
+            error_json = json.dumps({"error": f"Server error: {e.__class__.__name__}", "details": str(e)})
+            self.send_json(500, error_json)
+            print(f"Error processing API request: {e}")
+            return
+        # The new state goes out on the session's event stream
+        self.send_response(204)
+        self.end_headers()
+
+    def stream_events(self, session):
+        """
+        Streams the session's state as SSE: a full snapshot first, then a
+        delta after every change. Runs until the client disconnects or the
+        session is evicted (the browser's EventSource reconnects by itself).
+        """
+        self.send_response(200)
+        self.send_header("Content-type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        baseline, seen = None, None
+        try:
+            self.wfile.write(b"retry: 2000\n\n")
+            while True:
+                with session.changed:
+                    if session.revision == seen and not session.closed:
+                        session.changed.wait(event_keepalive)
+                    if session.closed:
+                        return
+                    if session.revision == seen:
+                        message = b": keep-alive\n\n" # also finds dead connections
+                    else:
+                        seen = session.revision
+                        with metrics.PHASES.time("state", "event"):
+                            state, baseline = session.game.state_delta(baseline)
+                        with metrics.PHASES.time("encode", "event"):
+                            message = f"data: {json.dumps(state)}\n\n".encode("utf-8")
+                with metrics.PHASES.time("write", "event"):
+                    self.wfile.write(message)
+                    self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
 
 
 # --- Servidor multithread  ---
@@ -549,6 +1276,12 @@ class ThreadingSimpleServer(ThreadingMixIn, HTTPServer):
 def run_server(port=8000):
     server_address = ("", port)
     httpd = ThreadingSimpleServer(server_address, RPGRequestHandler)
+    dungeon_pool.start()
+    static_files.preload("index.html")
+    try:
+        static_files.preload(sprite_manifest())
+    except Exception as e:
+        print(f"Could not build the sprite atlas: {e}")
     print(f"RPG server running at http://localhost:{port}\n")
     
     print("If './maps/cave.json' exists, it will be used else a new json map will be generated.")
@@ -0,0 +1,119 @@
+from collections import OrderedDict
+
+import numpy as np
+
+# Same order as main.directions / main.sides
+SIDES = ((-1, 0), (0, 1), (1, 0), (0, -1))
+
+
+# Index into SIDES of the opposite side, i.e. the way back to where a cell was reached from
+BACK = np.array([2, 3, 0, 1], dtype=np.int8)
+
+
+def distance_field(walkable_mask, source, max_distance):
+    """
+    BFS over 4-connected walkable cells from source, limited to max_distance
+    steps. Returns (distance, steps, origin): int16 step counts (-1 where
+    unreachable or too far) and int8 side indices leading one step back
+    towards source (-1 on source and unreached cells), both for the window
+    of the map around source, and the window's (y, x) origin in the map.
+
+    A path of at most max_distance steps never leaves the square of that
+    radius, so only that window is searched and the cost does not depend on
+    the map size. Each ring is a few vectorized ops over flat indices.
+    """
+    sy, sx = int(source[0]), int(source[1])
+    h, w = walkable_mask.shape
+    y0, x0 = max(sy - max_distance, 0), max(sx - max_distance, 0)
+    y1, x1 = min(sy + max_distance + 1, h), min(sx + max_distance + 1, w)
+    # A border of blocked cells, so neighbour indices never wrap around a row
+    passable = np.zeros((y1 - y0 + 2, x1 - x0 + 2), dtype=bool)
+    passable[1:-1, 1:-1] = walkable_mask[y0:y1, x0:x1]
+    width = passable.shape[1]
+    offsets = np.array([dy * width + dx for dy, dx in SIDES])
+
+    unvisited = passable.ravel()
+    distance = np.full(unvisited.shape, -1, dtype=np.int16)
+    steps = np.full(unvisited.shape, -1, dtype=np.int8)
+    claim = np.empty(unvisited.shape, dtype=np.intp)
+    frontier = np.array([(sy - y0 + 1) * width + sx - x0 + 1])
+    unvisited[frontier] = False  # the player's own tile, whatever it is
+    distance[frontier] = 0
+    for d in range(1, max_distance + 1):
+        candidates = (frontier[:, None] + offsets).ravel()
+        found = np.flatnonzero(unvisited[candidates])
+        if len(found) == 0:
+            break
+        # A cell reached from several frontier cells keeps the last of them
+        # (duplicates would multiply ring after ring in open rooms)
+        reached = candidates[found]
+        order = np.arange(len(reached))
+        claim[reached] = order
+        kept = claim[reached] == order
+        frontier = reached[kept]
+        steps[frontier] = BACK[found[kept] & 3]
+        unvisited[frontier] = False
+        distance[frontier] = d
+    shape = passable.shape
+    return distance.reshape(shape)[1:-1, 1:-1], steps.reshape(shape)[1:-1, 1:-1], (y0, x0)
+
+
+class FlowField:
+    """
+    Distance field towards one target tile, and for every reached cell the
+    direction (index into SIDES) of a neighbour one step closer, so following
+    the field is one lookup per enemy. The target's own cell has no direction.
+    """
+    __slots__ = ('distance', 'steps', 'origin')
+
+    def __init__(self, distance, steps, origin):
+        self.distance = distance
+        self.steps = steps
+        self.origin = origin
+
+    def direction(self, y, x):
+        """Side index that brings (y, x) one step closer, -1 if outside the field."""
+        y -= self.origin[0]
+        x -= self.origin[1]
+        if 0 <= y < self.steps.shape[0] and 0 <= x < self.steps.shape[1]:
+            return int(self.steps[y, x])
+        return -1
+
+    def directions(self, ys, xs):
+        """Vectorized direction() over arrays of positions."""
+        ys = ys - self.origin[0]
+        xs = xs - self.origin[1]
+        inside = (ys >= 0) & (ys < self.steps.shape[0]) & (xs >= 0) & (xs < self.steps.shape[1])
+        result = np.full(len(ys), -1, dtype=np.int8)
+        result[inside] = self.steps[ys[inside], xs[inside]]
+        return result
+
+
+class PathFinder:
+    """
+    Flow fields towards the player over one map's walkable mask, cached per
+    player tile (least recently used are dropped), since players walk back
+    and forth over the same corridors. Call invalidate() if the mask changes,
+    e.g. a door is opened or locked.
+    """
+
+    def __init__(self, walkable_mask, max_distance, cache_size=32):
+        self.walkable_mask = walkable_mask
+        self.max_distance = max_distance
+        self.cache_size = cache_size
+        self._fields = OrderedDict()
+
+    def field(self, target):
+        key = (int(target[0]), int(target[1]))
+        flow = self._fields.get(key)
+        if flow is not None:
+            self._fields.move_to_end(key)
+            return flow
+        flow = FlowField(*distance_field(self.walkable_mask, key, self.max_distance))
+        self._fields[key] = flow
+        if len(self._fields) > self.cache_size:
+            self._fields.popitem(last=False)
+        return flow
+
+    def invalidate(self):
+        self._fields.clear()
@@ -0,0 +1,174 @@
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from journal import Journal
+
+
+class Session:
+    """
+    One player's Game plus the lock that serializes their requests.
+
+    `changed` is a condition on that lock: event streams wait on it and are
+    woken by notify() whenever an action changes the game, or by close()
+    once the session has been evicted.
+    """
+    __slots__ = ('token', 'game', 'journal', 'lock', 'last_seen', 'changed', 'revision', 'closed')
+
+    def __init__(self, token, game, journal=None):
+        self.token = token
+        self.game = game
+        self.journal = journal
+        self.lock = threading.RLock()
+        self.last_seen = time.monotonic()
+        self.changed = threading.Condition(self.lock)
+        self.revision = 0
+        self.closed = False
+
+    def notify(self):
+        with self.changed:
+            self.revision += 1
+            self.changed.notify_all()
+
+    def close(self):
+        with self.changed:
+            self.closed = True
+            self.changed.notify_all()
+
+
+class SessionManager:
+    """
+    Token-keyed map of Game objects kept in least-recently-used order.
+
+    Sessions idle for longer than idle_timeout seconds are dropped, and once
+    max_sessions is reached the least recently used one is evicted to make
+    room for a new player.
+
+    With a journal_dir every session is journaled (see journal.Journal), and
+    a token that is not in memory, because it was evicted or the server
+    restarted, is restored from its snapshot by calling replay(game, event)
+    on the journal tail. Journals untouched for journal_ttl seconds, of
+    sessions no longer in memory, are deleted by a sweep run at most every
+    sweep_interval seconds when sessions are created.
+
+    Evicted sessions are closed (Session.close), then passed to every
+    function added with add_close_listener, from the evicting thread.
+    """
+
+    def __init__(self, game_factory, max_sessions=500, idle_timeout=1800,
+                 journal_dir=None, snapshot_every=50, replay=None, journal_ttl=7 * 24 * 3600,
+                 sweep_interval=600):
+        self.game_factory = game_factory
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.journal_dir = journal_dir
+        self.snapshot_every = snapshot_every
+        self.replay = replay
+        self.journal_ttl = journal_ttl
+        self.sweep_interval = sweep_interval
+        self._next_sweep = 0.0
+        self._close_listeners = []
+        self.evictions = 0
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def add_close_listener(self, listener):
+        self._close_listeners.append(listener)
+
+    def _close(self, evicted):
+        for old in evicted:
+            old.close()
+            for listener in self._close_listeners:
+                listener(old)
+
+    def live(self):
+        """The sessions in memory, least recently used first."""
+        with self._lock:
+            return list(self._sessions.values())
+
+    def get(self, token):
+        """Returns the live session for token (marking it as used), or None."""
+        with self._lock:
+            session = self._sessions.get(token) if token else None
+            if session is not None:
+                session.last_seen = time.monotonic()
+                self._sessions.move_to_end(token)
+            return session
+
+    def get_or_create(self, token):
+        """
+        Returns (session, created). Unknown tokens get a new session (created
+        is True, the caller should hand out the new token); journaled ones
+        are restored under their own token.
+        """
+        session = self.get(token)
+        if session is not None:
+            return session, False
+
+        # Build the Game outside the manager lock, it is the slow part
+        session = self._restore(token)
+        created = session is None
+        if created:
+            token = secrets.token_urlsafe(16)
+            game = self.game_factory()
+            journal = None
+            if self.journal_dir is not None:
+                # Opened by the first accepted action, see Journal.start
+                journal = Journal(self.journal_dir, token, self.snapshot_every)
+            session = Session(token, game, journal)
+            self.sweep_journals()
+
+        with self._lock:
+            existing = self._sessions.get(session.token)
+            if existing is not None:  # restored concurrently by another request
+                return existing, False
+            evicted = self._evict_locked(make_room=True)
+            self._sessions[session.token] = session
+        # Closed outside the manager lock, streams may be holding the session locks
+        self._close(evicted)
+        return session, created
+
+    def sweep_journals(self, force=False):
+        """Deletes expired journals (Journal.sweep) if sweep_interval has passed since the last sweep."""
+        if self.journal_dir is None:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            if not force and now < self._next_sweep:
+                return 0
+            self._next_sweep = now + self.sweep_interval
+            live = set(self._sessions)
+        return Journal.sweep(self.journal_dir, self.journal_ttl, live)
+
+    def _restore(self, token):
+        if self.journal_dir is None or not Journal.exists(self.journal_dir, token):
+            return None
+        try:
+            game, journal = Journal.restore(self.journal_dir, token, self.replay, self.snapshot_every)
+        except Exception as e:
+            print(f"Could not restore session {token}: {e}")
+            return None
+        return Session(token, game, journal)
+
+    def _evict_locked(self, make_room):
+        now = time.monotonic()
+        evicted = []
+        while self._sessions:
+            token, oldest = next(iter(self._sessions.items()))
+            idle = now - oldest.last_seen > self.idle_timeout
+            full = make_room and len(self._sessions) >= self.max_sessions
+            if not (idle or full):
+                break
+            del self._sessions[token]
+            self.evictions += 1
+            evicted.append(oldest)
+        return evicted
+
+    def evict_idle(self):
+        with self._lock:
+            evicted = self._evict_locked(make_room=False)
+        self._close(evicted)
@@ -0,0 +1,179 @@
+"""
+Headless balance runs: plays many games without the server, spread over a
+process pool, and reports per class_number how often the player wins, how
+long it survives and how hard both sides hit.
+
+    python simulate.py [--games 1000] [--classes 1 2 3] [--policy hunter]
+                       [--workers N] [--max-turns 2000] [--map PATH] [--json]
+
+Every game only depends on its seed, so a run is reproducible for any
+number of workers.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import main
+from dungeon_pool import prepare_dungeon
+
+MOVES = main.directions
+
+
+# --- Player policies: (game, rng) -> action ---
+
+def random_policy(game, rng):
+    if game.current_enemy is not None:
+        return rng.choice(('a', 'a', 'sp', 't'))
+    return rng.choice(MOVES)
+
+
+def hunter_policy(game, rng):
+    """Always uses the special attack, walks greedily towards the closest enemy."""
+    if game.current_enemy is not None:
+        return 'sp'
+    return step_towards_enemy(game, rng)
+
+
+def cautious_policy(game, rng):
+    """Like hunter, but tries to escape once below a quarter of its hp."""
+    if game.current_enemy is not None:
+        return 't' if game.player.hp < game.player.max_hp / 4 else 'sp'
+    return step_towards_enemy(game, rng)
+
+
+POLICIES = {"random": random_policy, "hunter": hunter_policy, "cautious": cautious_policy}
+
+
+def step_towards_enemy(game, rng, wander=0.2):
+    # Greedy on Manhattan distance, with some random steps to get out of dead ends
+    if not game.enemies or rng.random() < wander:
+        return rng.choice(MOVES)
+    position = np.array(game.player.position)
+    targets = np.array([e.position for e in game.enemies])
+    target = targets[np.abs(targets - position).sum(axis=1).argmin()]
+    best, best_distance = None, np.abs(target - position).sum()
+    for action, side in zip(MOVES, main.sides):
+        y, x = position + side
+        if game.walkable_mask[y, x] and game.occupancy[y, x] < 0:
+            distance = np.abs(target - (y, x)).sum()
+            if distance < best_distance:
+                best, best_distance = action, distance
+    return best or rng.choice(MOVES)
+
+
+# --- One game ---
+
+def play_game(job):
+    """Plays one headless game, returns its outcome and every hit dealt/taken."""
+    seed, class_number, policy_name, max_turns, map_path = job
+    rng = random.Random(seed)
+    game = main.Game(prepare_dungeon(map_path, render=False, rng=np.random.RandomState(seed)), render=False)
+    game.reseed(seed)
+    game.new_game("Sim", class_number)
+    policy = POLICIES[policy_name]
+
+    dealt, taken = [], []
+    turns = 0
+    start_enemies = len(game.enemies)
+    while not game.game_over and turns < max_turns:
+        game.update_current_enemy()
+        action = policy(game, rng)
+        enemy_hp = sum(e.hp for e in game.enemies)
+        player_hp = game.player.hp
+        game.process_player_action(action)
+        if action in ('a', 'sp') and enemy_hp > sum(e.hp for e in game.enemies):
+            dealt.append(enemy_hp - sum(e.hp for e in game.enemies))
+        if game.player.hp < player_hp:
+            taken.append(player_hp - game.player.hp)
+        turns += 1
+
+    return {
+        "class_number": class_number,
+        "won": game.player.is_alive() and not game.enemies,
+        "died": not game.player.is_alive(),
+        "turns": turns,
+        "kills": start_enemies - len(game.enemies),
+        "dealt": dealt,
+        "taken": taken,
+    }
+
+
+# --- Reports ---
+
+def percentiles(values, qs=(10, 50, 90)):
+    if not values:
+        return [None] * len(qs)
+    return [float(v) for v in np.percentile(values, qs)]
+
+
+def summarize(results):
+    """Per class_number: win/death rates, turns-to-death and hit distributions."""
+    by_class = {}
+    for r in results:
+        by_class.setdefault(r["class_number"], []).append(r)
+    report = {}
+    for class_number, games in sorted(by_class.items()):
+        deaths = [g["turns"] for g in games if g["died"]]
+        report[class_number] = {
+            "games": len(games),
+            "win_rate": sum(g["won"] for g in games) / len(games),
+            "death_rate": len(deaths) / len(games),
+            "turns_to_death": percentiles(deaths),
+            "mean_kills": sum(g["kills"] for g in games) / len(games),
+            "dealt_per_hit": percentiles([d for g in games for d in g["dealt"]]),
+            "taken_per_hit": percentiles([d for g in games for d in g["taken"]]),
+        }
+    return report
+
+
+def simulate(games=1000, classes=(1,), policy="hunter", workers=None, max_turns=2000, map_path=None,
+             seed=0, chunksize=8):
+    """Plays `games` games per class; returns (report, games per second)."""
+    jobs = [(seed + i, class_number, policy, max_turns, map_path)
+            for class_number in classes for i in range(games)]
+    t = time.perf_counter()
+    if workers == 1:
+        results = list(map(play_game, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(play_game, jobs, chunksize=chunksize))
+    elapsed = time.perf_counter() - t
+    return summarize(results), len(jobs) / elapsed
+
+
+def format_range(values):
+    return "-" if values[0] is None else "/".join(f"{v:.0f}" for v in values)
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Headless Dungeon Leveling balance runs.")
+    parser.add_argument("--games", type=int, default=1000, help="games per class")
+    parser.add_argument("--classes", type=int, nargs="+", default=[1])
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="hunter")
+    parser.add_argument("--workers", type=int, default=None, help="processes (1 runs in this process)")
+    parser.add_argument("--max-turns", type=int, default=2000)
+    parser.add_argument("--map", default=None, help="play this JSON/.dlm map instead of random ones")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    report, rate = simulate(args.games, args.classes, args.policy, args.workers, args.max_turns, args.map, args.seed)
+    if args.json:
+        print(json.dumps({"games_per_second": rate, "classes": report}, indent=2))
+        return
+    print(f"policy={args.policy}  {rate:.1f} games/s  (p10/p50/p90)")
+    print(f"{'class':>5} {'games':>6} {'win%':>6} {'death%':>7} {'kills':>6} {'turns to death':>16} "
+          f"{'dealt/hit':>14} {'taken/hit':>14}")
+    for class_number, r in report.items():
+        print(f"{class_number:>5} {r['games']:>6} {r['win_rate'] * 100:>6.1f} {r['death_rate'] * 100:>7.1f} "
+              f"{r['mean_kills']:>6.1f} {format_range(r['turns_to_death']):>16} "
+              f"{format_range(r['dealt_per_hit']):>14} {format_range(r['taken_per_hit']):>14}")
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,63 @@
+class SpatialHash:
+    """
+    Uniform-grid spatial hash over integer (y, x) positions.
+
+    Ids are bucketed by (y // bucket_size, x // bucket_size), so a radius
+    query only visits the buckets overlapping its bounding square, and a move
+    inside the same bucket is just a position update.
+    """
+
+    def __init__(self, bucket_size=8):
+        self.bucket_size = bucket_size
+        self._buckets = {}
+        self._positions = {}
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, id_):
+        return id_ in self._positions
+
+    def _key(self, position):
+        return position[0] // self.bucket_size, position[1] // self.bucket_size
+
+    def insert(self, id_, position):
+        position = (int(position[0]), int(position[1]))
+        self._positions[id_] = position
+        self._buckets.setdefault(self._key(position), set()).add(id_)
+
+    def remove(self, id_):
+        position = self._positions.pop(id_)
+        key = self._key(position)
+        bucket = self._buckets[key]
+        bucket.discard(id_)
+        if not bucket:
+            del self._buckets[key]
+
+    def move(self, id_, position):
+        position = (int(position[0]), int(position[1]))
+        old_key = self._key(self._positions[id_])
+        new_key = self._key(position)
+        self._positions[id_] = position
+        if old_key != new_key:
+            bucket = self._buckets[old_key]
+            bucket.discard(id_)
+            if not bucket:
+                del self._buckets[old_key]
+            self._buckets.setdefault(new_key, set()).add(id_)
+
+    def query(self, position, radius):
+        """Sorted ids within Euclidean distance `radius` of position."""
+        py, px = position
+        r2 = radius * radius
+        reach = int(radius)
+        size = self.bucket_size
+        found = []
+        for by in range((py - reach) // size, (py + reach) // size + 1):
+            for bx in range((px - reach) // size, (px + reach) // size + 1):
+                for id_ in self._buckets.get((by, bx), ()):
+                    ey, ex = self._positions[id_]
+                    if (ey - py) ** 2 + (ex - px) ** 2 <= r2:
+                        found.append(id_)
+        found.sort()
+        return found
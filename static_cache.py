@@ -0,0 +1,118 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+from collections import OrderedDict
+
+# Content types worth gzipping; images are already compressed
+COMPRESSIBLE = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"  # may be stored, but checked with If-None-Match every time
+
+
+class Asset:
+    __slots__ = ('body', 'gzip_body', 'etag', 'content_type', 'stamp')
+
+    def __init__(self, body, content_type, stamp):
+        self.body = body
+        self.content_type = content_type
+        self.stamp = stamp
+        self.etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        self.gzip_body = None
+        if content_type.startswith(COMPRESSIBLE):
+            packed = gzip.compress(body, compresslevel=6, mtime=0)
+            if len(packed) < len(body):
+                self.gzip_body = packed
+
+
+class StaticCache:
+    """
+    In-memory copies of static files, keyed by absolute path.
+
+    Files are read on first hit (or by preload) together with an ETag and,
+    for text types, a gzipped copy. Later hits only stat the file to notice
+    edits, except immutable ones (content-hashed names) which are trusted
+    as they are. The cache keeps at most max_bytes, dropping the least
+    recently used files; bigger files are served without being kept.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_file_bytes=8 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.size = 0
+        self._assets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def preload(self, *paths):
+        for path in paths:
+            try:
+                self.get(path)
+            except OSError:
+                pass
+
+    def get(self, path, immutable=False):
+        """The Asset for path, re-read if the file changed. Raises OSError."""
+        path = os.path.abspath(path)
+        with self._lock:
+            asset = self._assets.get(path)
+            if asset is not None:
+                self._assets.move_to_end(path)
+        if asset is not None and immutable:
+            return asset
+
+        st = os.stat(path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        if asset is not None and asset.stamp == stamp:
+            return asset
+
+        with open(path, "rb") as f:
+            body = f.read()
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if content_type.startswith("text/"):
+            content_type += "; charset=utf-8"
+        asset = Asset(body, content_type, stamp)
+        if len(body) <= self.max_file_bytes:
+            self._store(path, asset)
+        return asset
+
+    def _store(self, path, asset):
+        with self._lock:
+            old = self._assets.pop(path, None)
+            if old is not None:
+                self.size -= len(old.body) + len(old.gzip_body or b"")
+            self._assets[path] = asset
+            self.size += len(asset.body) + len(asset.gzip_body or b"")
+            while self.size > self.max_bytes and len(self._assets) > 1:
+                _, dropped = self._assets.popitem(last=False)
+                self.size -= len(dropped.body) + len(dropped.gzip_body or b"")
+
+    def respond(self, path, if_none_match=None, accept_encoding="", immutable=False):
+        """
+        Returns (status, headers, body) for a GET of path, or None if it is
+        not a readable file: 304 when If-None-Match has the current ETag,
+        otherwise 200 with the gzipped body if the client accepts it.
+        """
+        try:
+            asset = self.get(path, immutable)
+        except OSError:
+            return None
+
+        use_gzip = asset.gzip_body is not None and "gzip" in (accept_encoding or "")
+        etag = asset.etag[:-1] + '-gz"' if use_gzip else asset.etag
+        headers = [("ETag", etag), ("Cache-Control", IMMUTABLE if immutable else REVALIDATE)]
+        if asset.gzip_body is not None:
+            headers.append(("Vary", "Accept-Encoding"))
+
+        if if_none_match:
+            tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+            if etag in tags or "*" in tags:
+                return 304, headers, b""
+
+        body = asset.gzip_body if use_gzip else asset.body
+        headers.append(("Content-type", asset.content_type))
+        if use_gzip:
+            headers.append(("Content-Encoding", "gzip"))
+        headers.append(("Content-Length", str(len(body))))
+        return 200, headers, body